@@ -1,214 +1,278 @@
-import numpy as np
-import itertools
-import random
-
-
-class MinHashLSH:
-    def __init__(self, documents : list, num_hashes : int):
-        """
-        Initialize the MinHashLSH
-
-        Parameters
-        ----------
-        documents : list of str
-            The input documents for similarity analysis.
-        num_hashes : int
-            Number of hashes for mini-hashing.
-        """
-        self.documents = documents
-        self.num_hashes = num_hashes
-
-    def shingle_document(self, document, k=2) -> set:
-        """
-        Convert a document into a set of shingles.
-
-        Parameters
-        ----------
-        document : str
-            The input document.
-        k : int
-            The size of each shingle.
-
-        Returns
-        ----------
-        set
-            A set of shingles.
-        """
-        shingles = []
-        word_list = document.split()
-        for i in range(len(word_list)-k + 1) :
-            shingle = ''
-            for j in range(k):
-                shingle += word_list[i+j] + " "
-            shingles.append(shingle.strip())
-        shingles = set(shingles)
-
-        return shingles
-
-    def build_characteristic_matrix(self):
-        """
-        Build the characteristic matrix representing the presence of shingles in documents.
-
-        Returns
-        ----------
-        numpy.ndarray
-            The binary characteristic matrix.
-        """
-        all_shingles = self.shingle_document(self.documents[0])
-        for document in self.documents:
-            all_shingles = all_shingles | self.shingle_document(document)
-        matrix = np.zeros((len(all_shingles),len(self.documents)),dtype=int)
-        all_shingles = list(all_shingles)
-        for document in self.documents:
-            for shingle in all_shingles:
-                if shingle in document:
-                    matrix[all_shingles.index(shingle),self.documents.index(document)] = 1
-        return matrix
-
-    def min_hash_signature(self):
-        """
-        Perform Min-Hashing to generate hash signatures for documents.
-
-        Returns
-        ----------
-        numpy.ndarray
-            The Min-Hash signatures matrix.
-        """
-        prime = 4294967311
-        #prime = 7
-        characteristic_matrix = self.build_characteristic_matrix()
-        n , m = characteristic_matrix.shape
-        hashes = [(random.randint(1,n),random.randint(1,n)) for i in range(self.num_hashes)]
-        signature_matrix = [[np.inf for i in range(m)] for j in range(self.num_hashes)]
-        signature_matrix = np.array(signature_matrix )
-        for i in range(m):
-            for j in range(len(hashes)):
-                a , b = hashes[j]
-                for k in range(n):
-                    if characteristic_matrix[k,i] == 1 :
-                        h = (a + k * b) % prime
-                        if h < signature_matrix[j,i]:
-                            signature_matrix[j,i] = h
-
-        return signature_matrix.astype(int)
-
-    def lsh_buckets(self, signature, bands=10, rows_per_band=10, number_of_buckets = 30):
-        """
-        Group documents into Locality-Sensitive Hashing (LSH) buckets based on Min-Hash signatures.
-
-        Parameters
-        ----------
-        signature : numpy.ndarray
-            Min-Hash signatures for documents.
-        bands : int
-            Number of bands for LSH.
-        rows_per_band : int
-            Number of rows per band.
-
-        Returns
-        ----------
-        dict
-            A dictionary mapping bucket IDs to lists of document indices.
-        """
-        #
-        n , m = signature.shape
-        subvectors = []
-        for i in range(bands):
-            subvectors.append(signature[i*rows_per_band: (i+1)*rows_per_band])
-        subvectors = np.array(subvectors)
-        buckets = {}
-        for i in range(number_of_buckets):
-            buckets.update({i:[]})
-        for vector in subvectors:
-            strings = []
-            for i in range(m):
-                strings.append(','.join(vector[:,i].astype(str)))
-            for i in range(m):
-                for j in range(i+1,m):
-                    if strings[i] == strings[j]:
-                        x = random.randint(0,number_of_buckets-1)
-                        buckets[x].extend([i,j])
-
-        return buckets
-
-    def perform_lsh(self, number_of_bands=10, number_of_rows = 10, number_of_buckets = 10):
-        """
-        Perform the entire Locality-Sensitive Hashing (LSH) process.
-
-        Returns
-        ----------
-        dict
-            A dictionary mapping bucket IDs to lists of document indices.
-        """
-        #
-        signature_matrix = self.min_hash_signature()
-        return self.lsh_buckets(signature_matrix, bands=number_of_bands, rows_per_band=number_of_rows, number_of_buckets = number_of_buckets)
-
-    def jaccard_score(self, first_set:set, second_set:set):
-        """
-        Calculate jaccard score for two sets.
-
-        Parameters
-        ----------
-        first_set : set
-            Set of first shingled document.
-        second_set : set
-            Set of second shingled document.
-
-        Returns
-        ----------
-        float
-            Jaccard score.
-        """
-        union = first_set | second_set
-        intersection = first_set & second_set
-        return len(intersection) / len(union)
-
-    def jaccard_similarity_test(self, buckets, all_documents:list):
-        """
-        Test your near duplicate detection code based on jaccard similarity.
-
-        Parameters
-        ----------
-        buckets : dict
-            A dictionary mapping bucket IDs to lists of document indices.
-        all_documents : list
-            The input documents for similarity analysis.
-        """
-        correct_near_duplicates = 0
-        all_near_duplicates = 0
-
-        for bucket_id in buckets.keys():
-            docs_in_this_bucket = buckets[bucket_id]
-            unique_doc_ids = set(docs_in_this_bucket)
-            if len(unique_doc_ids) > 1:
-                combinations = list(itertools.combinations(unique_doc_ids, 2))
-                for comb in combinations:
-                    all_near_duplicates += 1
-
-                    first_doc_id = comb[0]
-                    second_doc_id = comb[1]
-
-                    first_shingled_doc = self.shingle_document(all_documents[first_doc_id], 2)
-                    second_shingled_doc = self.shingle_document(all_documents[second_doc_id], 2)
-
-                    near_duplicated_jaccard_score = self.jaccard_score(first_shingled_doc, second_shingled_doc)
-                    current_score = 0
-
-                    for _ in range(5):
-                        random_doc_id = first_doc_id
-                        while random_doc_id == first_doc_id or random_doc_id == second_doc_id:
-                            random_doc_id = random.randint(0, len(all_documents) - 1)
-                        random_shingled_doc = self.shingle_document(all_documents[random_doc_id], 2)
-
-                        random_jaccard_score = self.jaccard_score(first_shingled_doc, random_shingled_doc)
-
-                        if near_duplicated_jaccard_score > random_jaccard_score:
-                            current_score += 1
-
-                    if current_score == 5:
-                        correct_near_duplicates += 1
-
-        # a good score is around 0.8
-        print("your final score in near duplicate detection:", correct_near_duplicates / all_near_duplicates)
-
+import numpy as np
+import itertools
+import zlib
+from collections import defaultdict
+
+# number of set bits in every possible byte
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+# 64-bit FNV-1a parameters used to hash LSH bands
+FNV_OFFSET = np.uint64(14695981039346656037)
+FNV_PRIME = np.uint64(1099511628211)
+
+
+class MinHashLSH:
+    def __init__(self, documents : list, num_hashes : int, seed : int = None):
+        """
+        Initialize the MinHashLSH
+
+        Parameters
+        ----------
+        documents : list of str
+            The input documents for similarity analysis.
+        num_hashes : int
+            Number of hashes for mini-hashing.
+        seed : int, optional
+            Seed of the random generator used for the hash functions and the similarity test.
+        """
+        self.documents = documents
+        self.num_hashes = num_hashes
+        self.rng = np.random.default_rng(seed)
+
+    def shingle_document(self, document, k=2) -> set:
+        """
+        Convert a document into a set of shingles.
+
+        Parameters
+        ----------
+        document : str
+            The input document.
+        k : int
+            The size of each shingle.
+
+        Returns
+        ----------
+        set
+            A set of shingles.
+        """
+        word_list = document.split()
+        shingles = {' '.join(word_list[i:i + k]) for i in range(len(word_list) - k + 1)}
+
+        return shingles
+
+    def hash_shingles(self, document, k=2) -> np.ndarray:
+        """
+        Hash the k-shingles of a document without building the shingle strings.
+
+        Each word is hashed once with crc32 and the hash of a shingle is a polynomial
+        rolling hash of the hashes of its k words.
+
+        Parameters
+        ----------
+        document : str
+            The input document.
+        k : int
+            The size of each shingle.
+
+        Returns
+        ----------
+        numpy.ndarray
+            The unique 64-bit hashes of the shingles of the document.
+        """
+        word_hashes = np.array([zlib.crc32(word.encode()) for word in document.split()], dtype=np.uint64)
+        number_of_shingles = len(word_hashes) - k + 1
+        if number_of_shingles <= 0:
+            return np.empty(0, dtype=np.uint64)
+        shingle_hashes = np.zeros(number_of_shingles, dtype=np.uint64)
+        for j in range(k):
+            shingle_hashes = shingle_hashes * FNV_PRIME + word_hashes[j:j + number_of_shingles]
+        return np.unique(shingle_hashes)
+
+    def min_hash_signature(self):
+        """
+        Perform Min-Hashing to generate hash signatures for documents.
+
+        Returns
+        ----------
+        numpy.ndarray
+            The Min-Hash signatures matrix.
+        """
+        prime = 4294967291
+        #prime = 7
+        m = len(self.documents)
+        shingle_hashes = [self.hash_shingles(document) % np.uint64(prime) for document in self.documents]
+        # a, b and the shingle hashes are all below 2**32, so (a + b * x) fits in uint64
+        hashes = self.rng.integers(1, prime, size=(self.num_hashes, 2), dtype=np.uint64)
+        a = hashes[:, 0]
+        b = hashes[:, 1]
+        # hash values are below the prime, so they fit in uint32 and the uint32 maximum marks empty documents
+        signature_matrix = np.full((self.num_hashes, m), np.iinfo(np.uint32).max, dtype=np.uint32)
+        # CSR-style layout: the shingle hashes of document i are indices[indptr[i]:indptr[i+1]]
+        indptr = np.concatenate(([0], np.cumsum([len(h) for h in shingle_hashes]))).astype(np.int64)
+        indices = np.concatenate(shingle_hashes) if m else np.empty(0, dtype=np.uint64)
+        # only the shingles present in a block of documents are hashed, so the
+        # temporary (num_hashes, shingles in block) array stays small
+        block_size = 256
+        for start in range(0, m, block_size):
+            end = min(start + block_size, m)
+            block_indices = indices[indptr[start]:indptr[end]]
+            if not len(block_indices):
+                continue
+            hash_values = (a[:, None] + b[:, None] * block_indices) % np.uint64(prime)
+            offsets = indptr[start:end] - indptr[start]
+            non_empty = indptr[start:end] < indptr[start + 1:end + 1]
+            signature_matrix[:, start:end][:, non_empty] = np.minimum.reduceat(hash_values, offsets[non_empty], axis=1).astype(np.uint32)
+
+        return signature_matrix
+
+    def lsh_buckets(self, signature, bands=10, rows_per_band=10):
+        """
+        Group documents into Locality-Sensitive Hashing (LSH) buckets based on Min-Hash signatures.
+
+        Parameters
+        ----------
+        signature : numpy.ndarray
+            Min-Hash signatures for documents.
+        bands : int
+            Number of bands for LSH.
+        rows_per_band : int
+            Number of rows per band.
+
+        Returns
+        ----------
+        dict
+            A dictionary mapping bucket IDs to lists of document indices.
+            Bucket IDs are (band index, 64-bit hash of the band) pairs.
+        """
+        #
+        n , m = signature.shape
+        buckets = defaultdict(list)
+        for i in range(bands):
+            vector = signature[i*rows_per_band: (i+1)*rows_per_band].astype(np.uint64)
+            # FNV-1a over the rows of the band, seeded with the band index; hashes all documents at once
+            keys = np.full(m, FNV_OFFSET ^ np.uint64(i), dtype=np.uint64)
+            for row in vector:
+                keys = (keys ^ row) * FNV_PRIME
+            for j, key in enumerate(keys.tolist()):
+                buckets[(i, key)].append(j)
+
+        return dict(buckets)
+
+    def perform_lsh(self, number_of_bands=10, number_of_rows = 10):
+        """
+        Perform the entire Locality-Sensitive Hashing (LSH) process.
+
+        Returns
+        ----------
+        dict
+            A dictionary mapping bucket IDs to lists of document indices.
+        """
+        #
+        signature_matrix = self.min_hash_signature()
+        return self.lsh_buckets(signature_matrix, bands=number_of_bands, rows_per_band=number_of_rows)
+
+    def jaccard_score(self, first_set:set, second_set:set):
+        """
+        Calculate jaccard score for two sets.
+
+        Parameters
+        ----------
+        first_set : set
+            Set of first shingled document.
+        second_set : set
+            Set of second shingled document.
+
+        Returns
+        ----------
+        float
+            Jaccard score.
+        """
+        union = first_set | second_set
+        intersection = first_set & second_set
+        return len(intersection) / len(union)
+
+    def build_bit_vectors(self, shingled_documents:list):
+        """
+        Pack the shingle sets of the documents into bit vectors, one row per document.
+
+        Parameters
+        ----------
+        shingled_documents : list of set
+            Shingle sets of the documents.
+
+        Returns
+        ----------
+        numpy.ndarray
+            A uint8 array of shape (number of documents, ceil(number of shingles / 8)) where
+            bit i of a row is set if the document contains shingle i.
+        """
+        shingle_ids = {shingle: i for i, shingle in enumerate(set().union(*shingled_documents))}
+        bit_vectors = np.zeros((len(shingled_documents), (len(shingle_ids) + 7) // 8), dtype=np.uint8)
+        for j, shingles in enumerate(shingled_documents):
+            ids = np.fromiter((shingle_ids[shingle] for shingle in shingles), dtype=np.int64, count=len(shingles))
+            np.bitwise_or.at(bit_vectors[j], ids >> 3, (128 >> (ids & 7)).astype(np.uint8))
+        return bit_vectors
+
+    def jaccard_score_bits(self, first_bits, second_bits):
+        """
+        Calculate jaccard score for two documents packed with build_bit_vectors.
+
+        Parameters
+        ----------
+        first_bits : numpy.ndarray
+            Bit vector of first shingled document.
+        second_bits : numpy.ndarray
+            Bit vector of second shingled document.
+
+        Returns
+        ----------
+        float
+            Jaccard score.
+        """
+        union = int(POPCOUNT[first_bits | second_bits].sum())
+        if union == 0:
+            return 0.0
+        intersection = int(POPCOUNT[first_bits & second_bits].sum())
+        return intersection / union
+
+    def jaccard_similarity_test(self, buckets, all_documents:list):
+        """
+        Test your near duplicate detection code based on jaccard similarity.
+
+        Parameters
+        ----------
+        buckets : dict
+            A dictionary mapping bucket IDs to lists of document indices.
+        all_documents : list
+            The input documents for similarity analysis.
+        """
+        correct_near_duplicates = 0
+        all_near_duplicates = 0
+        shingled_documents = [self.shingle_document(document, 2) for document in all_documents]
+        bit_vectors = self.build_bit_vectors(shingled_documents)
+
+        for bucket_id in buckets.keys():
+            docs_in_this_bucket = buckets[bucket_id]
+            unique_doc_ids = set(docs_in_this_bucket)
+            if len(unique_doc_ids) > 1:
+                combinations = list(itertools.combinations(unique_doc_ids, 2))
+                for comb in combinations:
+                    all_near_duplicates += 1
+
+                    first_doc_id = comb[0]
+                    second_doc_id = comb[1]
+
+                    first_shingled_doc = bit_vectors[first_doc_id]
+                    second_shingled_doc = bit_vectors[second_doc_id]
+
+                    near_duplicated_jaccard_score = self.jaccard_score_bits(first_shingled_doc, second_shingled_doc)
+                    current_score = 0
+
+                    # draw from the other len - 2 ids, then shift past the pair to skip them
+                    low, high = sorted(comb)
+                    random_doc_ids = self.rng.integers(0, len(all_documents) - 2, size=5)
+                    random_doc_ids += random_doc_ids >= low
+                    random_doc_ids += random_doc_ids >= high
+                    for random_doc_id in random_doc_ids:
+                        random_shingled_doc = bit_vectors[random_doc_id]
+
+                        random_jaccard_score = self.jaccard_score_bits(first_shingled_doc, random_shingled_doc)
+
+                        if near_duplicated_jaccard_score > random_jaccard_score:
+                            current_score += 1
+
+                    if current_score == 5:
+                        correct_near_duplicates += 1
+
+        # a good score is around 0.8
+        print("your final score in near duplicate detection:", correct_near_duplicates / all_near_duplicates)
+
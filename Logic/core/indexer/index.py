@@ -1,11 +1,23 @@
 import time
 import os
-import json
-import copy
+import orjson
+import numpy as np
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
 from .indexes_enum import Indexes
 from .tiered_index import Tiered_index
 
 
+def _tf(field_values):
+    """
+    Count the terms of a document field (a list of strings, or None) in a single split pass.
+    """
+    if not field_values:
+        return Counter()
+    return Counter(word for value in field_values for word in value.split())
+
+
 class Index:
     def __init__(self, preprocessed_documents: list):
         """
@@ -14,11 +26,18 @@ class Index:
 
         self.preprocessed_documents = preprocessed_documents
 
+        # the builders only read the documents, so they can run side by side
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            documents = executor.submit(self.index_documents)
+            stars = executor.submit(self.index_stars)
+            genres = executor.submit(self.index_genres)
+            summaries = executor.submit(self.index_summaries)
+
         self.index = {
-            Indexes.DOCUMENTS.value: self.index_documents(),
-            Indexes.STARS.value: self.index_stars(),
-            Indexes.GENRES.value: self.index_genres(),
-            Indexes.SUMMARIES.value: self.index_summaries(),
+            Indexes.DOCUMENTS.value: documents.result(),
+            Indexes.STARS.value: stars.result(),
+            Indexes.GENRES.value: genres.result(),
+            Indexes.SUMMARIES.value: summaries.result(),
         }
 
     def index_documents(self):
@@ -50,20 +69,7 @@ class Index:
             So the index type is: {term: {document_id: tf}}
         """
 
-        index_stars = {}
-        for doc in self.preprocessed_documents:
-            stars = doc['stars']
-            stars_words = []
-            if stars:
-                for star in stars:
-                    stars_words.extend(star.split())
-            for word in set(stars_words):
-                if word not in index_stars.keys():
-                    index_stars.update({word:{doc['id']:stars_words.count(word)}})
-                else:
-                    index_stars[word].update({doc['id']:stars_words.count(word)})
-
-        return index_stars
+        return self._build_postings('stars')
 
     def index_genres(self):
         """
@@ -76,19 +82,7 @@ class Index:
             So the index type is: {term: {document_id: tf}}
         """
 
-        index_genres = {}
-        for doc in self.preprocessed_documents:
-            genres = doc['genres']
-            genres_words = []
-            if genres:
-                for genre in genres:
-                    genres_words.extend(genre.split())
-            for word in set(genres_words):
-                if word not in index_genres.keys():
-                    index_genres.update({word: {doc['id']: genres_words.count(word)}})
-                else:
-                    index_genres[word].update({doc['id']: genres_words.count(word)})
-        return index_genres
+        return self._build_postings('genres')
 
     def index_summaries(self):
         """
@@ -101,18 +95,43 @@ class Index:
             So the index type is: {term: {document_id: tf}}
         """
 
+        return self._build_postings('summaries')
+
+    def _build_postings(self, field: str):
+        """
+        Build the {term: {document_id: tf}} index of a field. The (term, document_id) pairs of all
+        documents are collected into two columns and the tfs are counted with one pandas groupby.
+
+        Parameters
+        ----------
+        field: str
+            The field of the documents to index (stars, genres, summaries)
+
+        Returns
+        ----------
+        dict
+            The index of the documents based on the field.
+        """
+
+        terms = []
+        positions = []
+        for position, doc in enumerate(self.preprocessed_documents):
+            if not doc[field]:
+                continue
+            words = []
+            for text in doc[field]:
+                words.extend(text.split())
+            terms.extend(words)
+            positions.extend([position] * len(words))
+
         current_index = {}
-        for doc in self.preprocessed_documents:
-            summaries = doc['summaries']
-            summaries_words = []
-            if summaries:
-                for summary in summaries:
-                    summaries_words.extend(summary.split())
-            for word in set(summaries_words):
-                if word not in current_index.keys():
-                    current_index.update({word: {doc['id']: summaries_words.count(word)}})
-                else:
-                    current_index[word].update({doc['id']: summaries_words.count(word)})
+        if not terms:
+            return current_index
+        # group by the position of the document rather than its id, so a document that appears twice
+        # in the corpus is not counted twice; groups come out in position order and the last one wins
+        tf = pd.DataFrame({'term': terms, 'position': positions}).groupby(['term', 'position'], sort=False).size()
+        for (term, position), count in zip(tf.index, tf.tolist()):
+            current_index.setdefault(term, {})[self.preprocessed_documents[position]['id']] = count
         return current_index
 
     def get_posting_list(self, word: str, index_type: str):
@@ -132,17 +151,44 @@ class Index:
             posting list of the word (you should return the list of document IDs that contain the word and ignore the tf)
         """
 
-        try:
-            if index_type == 'documents':
-                return self.index[Indexes.DOCUMENTS.value][word].keys()
-            if index_type == 'stars':
-                return self.index[Indexes.STARS.value][word].keys()
-            if index_type == 'genres':
-                return self.index[Indexes.GENRES.value][word].keys()
-            if index_type == 'summaries':
-                return self.index[Indexes.SUMMARIES.value][word].keys()
-        except:
+        if index_type not in self.index:
+            return []
+        posting = self.index[index_type].get(word)
+        if posting is None:
             return []
+        return posting.keys()
+
+    def get_compact_postings(self, index_type: str):
+        """
+        Get a term index with compact integer postings. Document IDs are replaced by their
+        position in the documents index, and each posting list is a pair of parallel int32
+        arrays, which scoring code can work on with numpy instead of walking dicts.
+
+        Parameters
+        ----------
+        index_type: str
+            type of index we want (stars, genres, summaries)
+
+        Returns
+        ----------
+        dict
+            {term: (document numbers, tfs)}, both int32 numpy arrays
+        list
+            document IDs by document number, to map the arrays back to IDs
+        """
+
+        if index_type not in self.index or index_type == Indexes.DOCUMENTS.value:
+            raise ValueError('Invalid index type')
+
+        int_to_doc_id = list(self.index[Indexes.DOCUMENTS.value])
+        doc_id_to_int = {doc_id: i for i, doc_id in enumerate(int_to_doc_id)}
+
+        compact_postings = {}
+        for term, posting in self.index[index_type].items():
+            doc_numbers = np.fromiter((doc_id_to_int[doc_id] for doc_id in posting), dtype=np.int32, count=len(posting))
+            tfs = np.fromiter(posting.values(), dtype=np.int32, count=len(posting))
+            compact_postings[term] = (doc_numbers, tfs)
+        return compact_postings, int_to_doc_id
 
     def add_document_to_index(self, document: dict):
         """
@@ -155,58 +201,13 @@ class Index:
         """
 
         doc_id = document['id']
-        doc_genres = document['genres']
-        doc_stars = document['stars']
-        doc_summaries = document['summaries']
-
-        self.index[Indexes.DOCUMENTS.value].update({doc_id:document})
-
-        words = []
-        for genre in doc_genres:
-            words.extend(genre.split())
-        genres_tf = {}
-        for genre in set(words):
-            genres_tf.update({genre:words.count(genre)})
-        for genre in genres_tf.keys():
-            if genre not in self.index[Indexes.GENRES.value]:
-                self.index[Indexes.GENRES.value].update({genre:{document['id']:genres_tf[genre]}})
-            else:
-                if document['id'] not in self.index[Indexes.GENRES.value][genre].keys():
-                    self.index[Indexes.GENRES.value][genre].update({document['id']:genres_tf[genre]})
-                else:
-                    self.index[Indexes.GENRES.value][genre][document['id']] += genres_tf[genre]
-
-        words = []
-        for star in doc_stars:
-            words.extend(star.split())
-        stars_tf = {}
-        for star in set(words):
-            stars_tf.update({star:words.count(star)})
-        for star in stars_tf.keys():
-            if star not in self.index[Indexes.STARS.value]:
-                self.index[Indexes.STARS.value].update({star:{document['id']:stars_tf[star]}})
-            else:
-                if document['id'] not in self.index[Indexes.STARS.value][star].keys():
-                    self.index[Indexes.STARS.value][star].update({document['id']:stars_tf[star]})
-                else:
-                    self.index[Indexes.STARS.value][star][document['id']] += stars_tf[star]
-
-        words = []
-        for summary in doc_summaries:
-            words.extend(summary.split())
-        summary_tf = {}
-        for word in set(words):
-            summary_tf.update({word:words.count(word)})
-        for word in summary_tf.keys():
-            if word not in self.index[Indexes.SUMMARIES.value]:
-                self.index[Indexes.SUMMARIES.value].update({word:{document['id']:summary_tf[word]}})
-            else:
-                if document['id'] not in self.index[Indexes.SUMMARIES.value][word].keys():
-                    self.index[Indexes.SUMMARIES.value][word].update({document['id']:summary_tf[word]})
-                else:
-                    self.index[Indexes.SUMMARIES.value][word][document['id']] += summary_tf[word]
-
+        self.index[Indexes.DOCUMENTS.value][doc_id] = document
 
+        for index_type in (Indexes.STARS.value, Indexes.GENRES.value, Indexes.SUMMARIES.value):
+            current_index = self.index[index_type]
+            for term, tf in _tf(document[index_type]).items():
+                posting = current_index.setdefault(term, {})
+                posting[doc_id] = posting.get(doc_id, 0) + tf
 
     def remove_document_from_index(self, document_id: str):
         """
@@ -218,17 +219,10 @@ class Index:
             ID of the document to remove from all the indexes
         """
 
-        if document_id in self.index[Indexes.DOCUMENTS.value].keys():
-            self.index[Indexes.DOCUMENTS.value].pop(document_id)
-        for star in self.index[Indexes.STARS.value]:
-            if document_id in self.index[Indexes.STARS.value][star]:
-                self.index[Indexes.STARS.value][star].pop(document_id)
-        for genre in self.index[Indexes.GENRES.value]:
-            if document_id in self.index[Indexes.GENRES.value][genre]:
-                self.index[Indexes.GENRES.value][genre].pop(document_id)
-        for word in self.index[Indexes.SUMMARIES.value]:
-            if document_id in self.index[Indexes.SUMMARIES.value][word]:
-                self.index[Indexes.SUMMARIES.value][word].pop(document_id)
+        self.index[Indexes.DOCUMENTS.value].pop(document_id, None)
+        for index_type in (Indexes.STARS.value, Indexes.GENRES.value, Indexes.SUMMARIES.value):
+            for posting in self.index[index_type].values():
+                posting.pop(document_id, None)
 
 
     def check_add_remove_is_correct(self):
@@ -243,49 +237,45 @@ class Index:
             'summaries': ['good']
         }
 
-        index_before_add = copy.deepcopy(self.index)
+        # only the postings this check looks at are snapshotted, not the whole index
+        checked_terms = [
+            (Indexes.STARS.value, 'tim'),
+            (Indexes.STARS.value, 'henry'),
+            (Indexes.GENRES.value, 'drama'),
+            (Indexes.GENRES.value, 'crime'),
+            (Indexes.SUMMARIES.value, 'good'),
+        ]
+
+        def snapshot():
+            postings = {(index_type, term): dict(self.index[index_type].get(term, {}))
+                        for index_type, term in checked_terms}
+            document = self.index[Indexes.DOCUMENTS.value].get(dummy_document['id'])
+            return postings, document
+
+        postings_before_add, document_before_add = snapshot()
         self.add_document_to_index(dummy_document)
-        index_after_add = copy.deepcopy(self.index)
+        postings_after_add, document_after_add = snapshot()
 
-        if index_after_add[Indexes.DOCUMENTS.value]['100'] != dummy_document:
+        if document_after_add != dummy_document:
             print('Add is incorrect, document')
             return
 
-        if (set(index_after_add[Indexes.STARS.value]['tim']).difference(set(index_before_add[Indexes.STARS.value]['tim']))
-                != {dummy_document['id']}):
-            print('Add is incorrect, tim')
-            return
-
-        if (set(index_after_add[Indexes.STARS.value]['henry']).difference(set(index_before_add[Indexes.STARS.value]['henry']))
-                != {dummy_document['id']}):
-            print('Add is incorrect, henry')
-            return
-        if (set(index_after_add[Indexes.GENRES.value]['drama']).difference(set(index_before_add[Indexes.GENRES.value]['drama']))
-                != {dummy_document['id']}):
-            print('Add is incorrect, drama')
-            return
-
-        if (set(index_after_add[Indexes.GENRES.value]['crime']).difference(set(index_before_add[Indexes.GENRES.value]['crime']))
-                != {dummy_document['id']}):
-            print('Add is incorrect, crime')
-            return
-
-        if (set(index_after_add[Indexes.SUMMARIES.value]['good']).difference(set(index_before_add[Indexes.SUMMARIES.value]['good']))
-                != {dummy_document['id']}):
-            print('Add is incorrect, good')
-            return
+        for index_type, term in checked_terms:
+            if (set(postings_after_add[(index_type, term)]).difference(set(postings_before_add[(index_type, term)]))
+                    != {dummy_document['id']}):
+                print('Add is incorrect, ' + term)
+                return
 
         print('Add is correct')
 
         self.remove_document_from_index('100')
-        index_after_remove = copy.deepcopy(self.index)
 
-        if index_after_remove == index_before_add:
+        if snapshot() == (postings_before_add, document_before_add):
             print('Remove is correct')
         else:
             print('Remove is incorrect')
 
-    def store_index(self, path: str, index_type: str = None):
+    def store_index(self, path: str, index_type: str = None, columnar: bool = False):
         """
         Stores the index in a file (such as a JSON file)
 
@@ -296,6 +286,9 @@ class Index:
         index_type: str or None
             type of index we want to store (documents, stars, genres, summaries)
             if None store tiered index
+        columnar: bool
+            if True store a term index (stars, genres, summaries) as a zstd compressed Parquet
+            table of (term, doc_id, tf) rows instead of JSON
         """
 
         if not os.path.exists(path):
@@ -308,13 +301,21 @@ class Index:
             if index_type not in self.index :
                 raise ValueError('Invalid index type')
 
+            if columnar:
+                if index_type == Indexes.DOCUMENTS.value:
+                    raise ValueError('Only term indexes can be stored in columnar form')
+                path = path + index_type + "_index.parquet"
+                self.postings_to_frame(self.index[index_type]).to_parquet(path, compression='zstd', index=False)
+                return
+
             path = path + index_type  + "_index.json"
-            with open(path, "w") as file:
-                json.dump(self.index[index_type], file, indent=4)
+            with open(path, "wb") as file:
+                file.write(orjson.dumps(self.index[index_type]))
 
     def load_index(self, path: str, index_type: str = None):
         """
-        Loads the index from a file (such as a JSON file)
+        Loads the index from a file (such as a JSON file). Files ending in .parquet are read as
+        term indexes stored with store_index(..., columnar=True).
 
         Parameters
         ----------
@@ -325,31 +326,71 @@ class Index:
         if not os.path.exists(path):
             os.makedirs(path)
 
+        if index_type is not None and index_type not in self.index:
+            raise ValueError('Invalid index type')
+
+        if path.endswith('.parquet'):
+            loaded_index = self.frame_to_postings(pd.read_parquet(path))
+        else:
+            with open(path, 'rb') as f:
+                loaded_index = orjson.loads(f.read())
+
         if index_type is None:
-            with open(path, 'r') as f:
-                self.index = json.load(f)
-                f.close()
+            self.index = loaded_index
+        else:
+            self.index[index_type] = loaded_index
 
-        if index_type not in self.index:
-            raise ValueError('Invalid index type')
 
-        if index_type == 'documents':
-            with open(path, 'r') as f:
-                self.index[Indexes.DOCUMENTS.value] = json.load(f)
-                f.close()
-        if index_type == 'stars':
-            with open(path, 'r') as f:
-                self.index[Indexes.STARS.value] = json.load(f)
-                f.close()
-        if index_type == 'genres':
-            with open(path, 'r') as f:
-                self.index[Indexes.GENRES.value] = json.load(f)
-                f.close()
-        if index_type == 'summaries':
-            with open(path, 'r') as f:
-                self.index[Indexes.SUMMARIES.value] = json.load(f)
-                f.close()
+    @staticmethod
+    def postings_to_frame(index: dict):
+        """
+        Flatten a term index into a table with one row per posting.
+
+        Parameters
+        ----------
+        index : dict
+            A term index of the form {term: {document_id: tf}}
+
+        Returns
+        ----------
+        pd.DataFrame
+            The postings with columns term, doc_id and tf. term and doc_id are categorical so
+            Parquet dictionary encodes them.
+        """
+
+        terms = []
+        doc_ids = []
+        tfs = []
+        for term, posting in index.items():
+            terms.extend([term] * len(posting))
+            doc_ids.extend(posting.keys())
+            tfs.extend(posting.values())
+        return pd.DataFrame({
+            'term': pd.Categorical(terms),
+            'doc_id': pd.Categorical(doc_ids),
+            'tf': pd.array(tfs, dtype='int32'),
+        })
+
+    @staticmethod
+    def frame_to_postings(frame):
+        """
+        Rebuild a term index from the table made by postings_to_frame.
+
+        Parameters
+        ----------
+        frame : pd.DataFrame
+            The postings with columns term, doc_id and tf
+
+        Returns
+        ----------
+        dict
+            The term index of the form {term: {document_id: tf}}
+        """
 
+        index = {}
+        for term, doc_id, tf in zip(frame['term'].tolist(), frame['doc_id'].tolist(), frame['tf'].tolist()):
+            index.setdefault(term, {})[doc_id] = tf
+        return index
 
     def check_if_index_loaded_correctly(self, index_type: str, loaded_index: dict):
         """
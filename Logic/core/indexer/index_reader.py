@@ -1,5 +1,7 @@
 from .indexes_enum import Indexes,Index_types
-import json
+import orjson
+from functools import lru_cache
+from pathlib import Path
 class Index_reader:
     def __init__(self,path: str, index_name: Indexes, index_type: Index_types = None):
         """
@@ -7,7 +9,7 @@ class Index_reader:
 
         Parameters
         ----------
-        path : str
+        path : str | Path
             The path to the indexes.
         index_name : Indexes
             The name of the index to read.
@@ -28,13 +30,30 @@ class Index_reader:
         dict
             The index.
         """
-        absolute_path = self.path + self.index_name.value
+        file_name = self.index_name.value
         
         if self.index_type != None:
-            absolute_path = absolute_path + "_" + self.index_type.value
+            file_name = file_name + "_" + self.index_type.value
 
-        absolute_path = absolute_path + "_index.json"
+        absolute_path = Path(self.path) / (file_name + "_index.json")
         
-        with open(absolute_path, 'r') as file:
-            return json.load(file)
-        
\ No newline at end of file
+        with open(absolute_path, 'rb') as file:
+            return orjson.loads(file.read())
+
+
+@lru_cache(maxsize=None)
+def get_index_reader(path: str, index_name: Indexes, index_type: Index_types = None):
+    """
+    Returns an Index_reader of the index, reading the file only the first time it is asked for.
+    Readers are shared, so their index must be treated as read only.
+
+    Parameters
+    ----------
+    path : str | Path
+        The path to the indexes.
+    index_name : Indexes
+        The name of the index to read.
+    index_type : Index_types
+        The type of the index to read.
+    """
+    return Index_reader(path, index_name, index_type)
@@ -1,7 +1,6 @@
 from .index_reader import Index_reader
 from .indexes_enum import Indexes, Index_types
-import json
-import numpy as np
+import orjson
 
 class Metadata_index:
     def __init__(self, path='index/'):
@@ -29,9 +28,8 @@ class Metadata_index:
         
         """
 
-        with open(self.path + "preprocessed_data.json",'r') as f :
-            self.documents = json.load(f)
-            f.close()
+        with open(self.path + "preprocessed_data.json",'rb') as f :
+            self.documents = orjson.loads(f.read())
 
 
     def create_metadata_index(self):    
@@ -58,14 +56,9 @@ class Metadata_index:
             The field to get the document lengths for.
         """
 
-        lengths = []
-        for doc in self.documents:
-            if doc[where] :
-                lengths.append(len(doc[where]))
-            else:
-                lengths.append(0)
-        lengths = np.array(lengths)
-        return np.mean(lengths)
+        if not self.documents:
+            return 0.0
+        return sum(len(doc[where]) for doc in self.documents if doc[where]) / len(self.documents)
 
     def store_metadata_index(self, path):
         """
@@ -77,8 +70,8 @@ class Metadata_index:
             The path to the directory where the indexes are stored.
         """
         path =  path + Indexes.DOCUMENTS.value + '_' + Index_types.METADATA.value + '_index.json'
-        with open(path, 'w') as file:
-            json.dump(self.metadata_index, file, indent=4)
+        with open(path, 'wb') as file:
+            file.write(orjson.dumps(self.metadata_index))
 
 
     
@@ -1,3 +1,4 @@
+import numpy as np
 from .graph import LinkGraph
 from ..indexer.indexes_enum import Indexes
 from ..indexer.index_reader import Index_reader
@@ -19,6 +20,9 @@ class LinkAnalyzer:
         self.graph = LinkGraph()
         self.hubs = []
         self.authorities = []
+        # sets mirroring hubs and authorities for constant time membership checks
+        self.hub_set = set()
+        self.authority_set = set()
         self.initiate_params()
 
     def initiate_params(self):
@@ -31,10 +35,14 @@ class LinkAnalyzer:
         """
         for movie in self.root_set:
             self.graph.add_node(movie["id"])
-            self.hubs.append(movie["id"])
+            if movie["id"] not in self.hub_set:
+                self.hub_set.add(movie["id"])
+                self.hubs.append(movie["id"])
             for star in movie["stars"]:
                 self.graph.add_node(star)
-                self.authorities.append(star)
+                if star not in self.authority_set:
+                    self.authority_set.add(star)
+                    self.authorities.append(star)
                 self.graph.add_edge(movie["id"],star)
 
 
@@ -55,18 +63,17 @@ class LinkAnalyzer:
         and refer to the nodes in the root set to the graph and to the list of hubs and authorities.
         """
         for movie in corpus:
-            is_in_base_set = False
-            for star in movie["stars"]:
-                if star in self.authorities:
-                    is_in_base_set = True
+            is_in_base_set = any(star in self.authority_set for star in movie["stars"])
             if is_in_base_set:
-                if movie["id"] not in self.hubs:
+                if movie["id"] not in self.hub_set:
                     self.graph.add_node(movie["id"])
+                    self.hub_set.add(movie["id"])
                     self.hubs.append(movie["id"])
                     for star in movie["stars"]:
                         self.graph.add_node(star)
                         self.graph.add_edge(movie["id"], star)
-                        if star not in self.authorities:
+                        if star not in self.authority_set:
+                            self.authority_set.add(star)
                             self.authorities.append(star)
 
 
@@ -89,34 +96,39 @@ class LinkAnalyzer:
         list
             List of names of 10 movies with the most scores obtained by Hits algorithm in descending order
         """
-        a_s = {}
-        h_s = {}
-
-        for hub in self.hubs:
-            h_s.update({hub:1})
-        for authority in self.authorities:
-            a_s.update({authority:1})
-
-
+        hub_ids = {hub: i for i, hub in enumerate(self.hubs)}
+        authority_ids = {authority: i for i, authority in enumerate(self.authorities)}
+
+        # the graph is flattened once into parallel (hub, authority) edge arrays, so each
+        # iteration is two bincounts over the edges instead of dict walks over every node
+        edge_hubs = []
+        edge_authorities = []
+        for hub, i in hub_ids.items():
+            for successor in self.graph.get_successors(hub):
+                edge_hubs.append(i)
+                edge_authorities.append(authority_ids[successor])
+        edge_hubs = np.array(edge_hubs, dtype=np.int64)
+        edge_authorities = np.array(edge_authorities, dtype=np.int64)
+
+        h_s = np.ones(len(hub_ids))
+        a_s = np.ones(len(authority_ids))
         for i in range(num_iteration):
-            for hub in self.hubs:
-                successors = self.graph.get_successors(hub)
-                sum = 0
-                for successor in successors:
-                    sum += a_s[successor]
-                h_s[hub] = sum
-            for authority in self.authorities:
-                predecessors = self.graph.get_predecessors(authority)
-                sum = 0
-                for predecessor in predecessors:
-                    sum += h_s[predecessor]
-                a_s[authority] = sum
-
-        a_s = sorted(a_s,reverse=True)
-        h_s = sorted(h_s,reverse=True)
-
-
-        return a_s[:max_result], h_s[:max_result]
+            h_s = np.bincount(edge_hubs, weights=a_s[edge_authorities], minlength=len(hub_ids))
+            a_s = np.bincount(edge_authorities, weights=h_s[edge_hubs], minlength=len(authority_ids))
+            # the scores grow geometrically with the iterations, so they are kept at unit length
+            h_norm = np.linalg.norm(h_s)
+            a_norm = np.linalg.norm(a_s)
+            if h_norm > 0:
+                h_s /= h_norm
+            if a_norm > 0:
+                a_s /= a_norm
+
+        authorities = list(authority_ids)
+        hubs = list(hub_ids)
+        top_authorities = [authorities[i] for i in np.argsort(-a_s, kind='stable')[:max_result]]
+        top_hubs = [hubs[i] for i in np.argsort(-h_s, kind='stable')[:max_result]]
+
+        return top_authorities, top_hubs
 
 if __name__ == "__main__":
     # You can use this section to run and test the results of your link analyzer
@@ -12,15 +12,15 @@ class LinkGraph:
         self.number_of_nodes = 0
 
     def add_edge(self, u_of_edge, v_of_edge):
-        if v_of_edge not in self.get_successors(u_of_edge):
-            u = self.nodes[u_of_edge]
-            v = self.nodes[v_of_edge]
+        u = self.nodes[u_of_edge]
+        v = self.nodes[v_of_edge]
+        if v not in u.successors:
             u.add_successor(v)
             v.add_predecessor(u)
             self.number_of_edges += 1
 
     def add_node(self, node_to_add):
-        if node_to_add not in self.nodes.keys():
+        if node_to_add not in self.nodes:
             node = GraphNode(node_to_add)
             self.nodes.update({node_to_add:node})
             self.number_of_nodes += 1
@@ -41,11 +41,11 @@ class GraphNode:
 
     def __init__(self,name):
         self.name = name
-        self.successors = []
-        self.predecessors = []
+        self.successors = set()
+        self.predecessors = set()
 
     def add_successor(self,successor):
-        self.successors.append(successor)
+        self.successors.add(successor)
 
     def add_predecessor(self,predecessor):
-        self.predecessors.append(predecessor)
\ No newline at end of file
+        self.predecessors.add(predecessor)
\ No newline at end of file
@@ -1,46 +1,159 @@
 import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
 import numpy as np
 from utility.preprocess import Preprocessor
-from utility.scorer import Scorer
+from utility.scorer import PostingsMatrix, Scorer
 from indexer.index import Indexes
 from indexer.indexes_enum import Index_types
-from indexer.index_reader import Index_reader
+from indexer.index_reader import get_index_reader
 
+# the stored indexes are read from MIR_INDEX_DIR if it is set, e.g. a tmpfs mount that keeps them in RAM
+INDEX_DIR = Path(os.getenv("MIR_INDEX_DIR", Path(__file__).resolve().parent / "indexer" / "stored_index"))
 
 class SearchEngine:
-    def __init__(self):
+    def __init__(self, quantize_bm25=False, path=INDEX_DIR):
         """
         Initializes the search engine.
 
+        Parameters
+        ----------
+        quantize_bm25 : bool, optional
+            If True, safe and unsafe Okapi BM25 ranking score with int16 quantized term scores and
+            integer accumulation instead of float64. Defaults to False.
+        path : Path, optional
+            The directory of the stored indexes. Defaults to INDEX_DIR.
         """
-        path = "C:/Users/ASUS/PycharmProjects/MIR-project/Logic/core/indexer/stored_index/"
         self.document_indexes = {
-            Indexes.STARS: Index_reader(path, Indexes.STARS),
-            Indexes.GENRES: Index_reader(path, Indexes.GENRES),
-            Indexes.SUMMARIES: Index_reader(path, Indexes.SUMMARIES),
+            Indexes.STARS: get_index_reader(path, Indexes.STARS),
+            Indexes.GENRES: get_index_reader(path, Indexes.GENRES),
+            Indexes.SUMMARIES: get_index_reader(path, Indexes.SUMMARIES),
         }
         self.tiered_index = {
-            Indexes.STARS: Index_reader(path, Indexes.STARS, Index_types.TIERED),
-            Indexes.GENRES: Index_reader(path, Indexes.GENRES, Index_types.TIERED),
-            Indexes.SUMMARIES: Index_reader(
+            Indexes.STARS: get_index_reader(path, Indexes.STARS, Index_types.TIERED),
+            Indexes.GENRES: get_index_reader(path, Indexes.GENRES, Index_types.TIERED),
+            Indexes.SUMMARIES: get_index_reader(
                 path, Indexes.SUMMARIES, Index_types.TIERED
             ),
         }
         self.document_lengths_index = {
-            Indexes.STARS: Index_reader(
+            Indexes.STARS: get_index_reader(
                 path, Indexes.STARS, Index_types.DOCUMENT_LENGTH
             ),
-            Indexes.GENRES: Index_reader(
+            Indexes.GENRES: get_index_reader(
                 path, Indexes.GENRES, Index_types.DOCUMENT_LENGTH
             ),
-            Indexes.SUMMARIES: Index_reader(
+            Indexes.SUMMARIES: get_index_reader(
                 path, Indexes.SUMMARIES, Index_types.DOCUMENT_LENGTH
             ),
         }
-        self.metadata_index = Index_reader(
+        self.metadata_index = get_index_reader(
             path, Indexes.DOCUMENTS, Index_types.METADATA
         )
+        self.N = int(self.metadata_index.index['document_count'])
+        self.avgdl = {
+            field: self.metadata_index.index["averge_document_length"][field.value]
+            for field in self.document_indexes
+        }
+        # every document gets a dense position, so the field scores are summed into one array per query
+        self._dense_to_docid = np.array(sorted(set().union(*(lengths.index for lengths in self.document_lengths_index.values()))))
+        self._docid_to_dense = {doc_id: position for position, doc_id in enumerate(self._dense_to_docid.tolist())}
+        self.total_document_length = {
+            field: sum(self.document_lengths_index[field].index.values())
+            for field in self.document_indexes
+        }
+        # the idfs of the whole field indexes are computed once here, the other caches are filled
+        # lazily by the scorers
+        self.idf_cache = {
+            field: {term: math.log(self.N / len(posting)) for term, posting in self.document_indexes[field].index.items() if posting}
+            for field in self.document_indexes
+        }
+        self.cf_cache = {field: {} for field in self.document_indexes}
+        self.postings_cache = {field: {} for field in self.document_indexes}
+        self.lengths_cache = {field: {} for field in self.document_indexes}
+        self.path = path
+        self.postings_matrices = {field: self.load_postings_matrix(field) for field in self.document_indexes}
+        self.quantized_cache = {field: {} for field in self.document_indexes}
+        self.max_score_cache = {field: {tier: {} for tier in ["first_tier", "second_tier", "third_tier"]}
+                                for field in self.document_indexes}
+        self.quantize_bm25 = quantize_bm25
+        # the three field indexes are independent, so they are scored side by side
+        self.executor = ThreadPoolExecutor(max_workers=3)
+        # the stopwords and the lemmatizer are loaded once instead of for every query
+        self._preprocessor = Preprocessor([])
+        # searching is deterministic in the preprocessed query and the parameters, so repeated
+        # queries are answered from per engine lru caches, emptied by clear_search_cache. The caches
+        # wrap bound methods, so the engine and its caches reference each other until close empties them
+        self.preprocess_query = lru_cache(maxsize=1024)(self._preprocess_query)
+        self._cached_search = lru_cache(maxsize=1024)(self._search)
+
+
+    def store_postings_matrices(self, path=None):
+        """
+        Stores the postings matrices of the field indexes next to the indexes, so engines and worker
+        processes created later memory-map them instead of building them.
 
+        Parameters
+        ----------
+        path : Path, optional
+            The directory of the stored indexes. Defaults to the directory the engine read them from.
+        """
+        if path is None:
+            path = self.path
+        for field, postings_matrix in self.postings_matrices.items():
+            matrix_path = Path(path) / f"{field.value}_matrix"
+            postings_matrix.save(matrix_path)
+            with open(matrix_path / "signature.json", "w") as file:
+                json.dump(self.get_index_signature(field), file)
+
+    def get_index_signature(self, field):
+        """
+        Returns what identifies the version of a field index a postings matrix is built from.
+
+        Parameters
+        ----------
+        field : Indexes
+            The field of the index.
+
+        Returns
+        -------
+        dict
+            The number of terms and postings of the index, and the modification time of its file.
+        """
+        index = self.document_indexes[field].index
+        return {
+            "terms": len(index),
+            "postings": sum(len(posting) for posting in index.values()),
+            "mtime": os.stat(Path(self.path) / f"{field.value}_index.json").st_mtime_ns,
+        }
+
+    def load_postings_matrix(self, field):
+        """
+        Memory-maps the postings matrix of a field stored with store_postings_matrices, if it was
+        stored from the current version of the field index, or builds it from the index otherwise.
+
+        Parameters
+        ----------
+        field : Indexes
+            The field of the index.
+
+        Returns
+        -------
+        PostingsMatrix
+            The postings matrix of the field index.
+        """
+        matrix_path = Path(self.path) / f"{field.value}_matrix"
+        try:
+            with open(matrix_path / "signature.json") as file:
+                signature = json.load(file)
+        except (OSError, ValueError):
+            signature = None
+        if signature == self.get_index_signature(field):
+            return PostingsMatrix.load(matrix_path)
+        return PostingsMatrix(self.document_indexes[field].index)
 
     def search(
         self,
@@ -82,9 +195,38 @@ class SearchEngine:
         list
             A list of tuples containing the document IDs and their scores sorted by their scores.
         """
-        preprocessor = Preprocessor([query])
-        query = preprocessor.preprocess()[0]
+        query = self.preprocess_query(query)
+        results = self._cached_search(query, method, frozenset(weights.items()), safe_ranking, max_results,
+                                      smoothing_method, alpha, lamda)
+        return list(results)
+
+    def _preprocess_query(self, query):
+        """
+        Preprocesses a raw query into its terms. Wrapped by the engine's preprocess_query cache.
+
+        Parameters
+        ----------
+        query : str
+            The query to preprocess.
+
+        Returns
+        -------
+        tuple
+            The terms of the preprocessed query.
+        """
+        return tuple(self._preprocessor.preprocess_tokens(query))
 
+    def _search(self, query, method, weights, safe_ranking, max_results, smoothing_method, alpha, lamda):
+        """
+        Searches for a preprocessed query. Wrapped by the engine's search cache, so the weights
+        are passed as a frozenset of their items and the results are returned as a tuple.
+
+        Returns
+        -------
+        tuple
+            The tuples of the document IDs and their scores sorted by their scores.
+        """
+        weights = dict(weights)
         scores = {}
         if method == "unigram":
             scores = self.find_scores_with_unigram_model(
@@ -97,19 +239,41 @@ class SearchEngine:
                 query, method, weights, max_results, scores
             )
 
-        final_scores = {}
+        doc_ids, doc_scores = self.aggregate_score_arrays(weights, scores)
+
+        # only the top max_results are selected with argpartition before they are sorted
+        top = np.arange(len(doc_scores))
+        if max_results is not None and max_results < len(doc_scores):
+            top = np.argpartition(-doc_scores, max_results)[:max_results]
+        top = top[np.argsort(-doc_scores[top], kind='stable')]
+
+        return tuple(zip(doc_ids[top].tolist(), doc_scores[top].tolist()))
+
+    def clear_search_cache(self):
+        """
+        Empties the caches of preprocessed queries and search results, e.g. after the indexes change.
+        """
+        self.preprocess_query.cache_clear()
+        self._cached_search.cache_clear()
 
-        final_scores = self.aggregate_scores(weights, scores, final_scores)
+    def close(self):
+        """
+        Shuts the engine's thread pool down and empties its caches. The engine can not search afterwards.
+        """
+        self.executor.shutdown(wait=True)
+        self.clear_search_cache()
 
-        result = sorted(final_scores.items(), key=lambda x: x[1], reverse=True)
-        if max_results is not None:
-            result = result[:max_results]
+    def __enter__(self):
+        return self
 
-        return result
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
-    def aggregate_scores(self, weights, scores, final_scores):
+    def aggregate_score_arrays(self, weights, scores):
         """
-        Aggregates the scores of the fields.
+        Aggregates the scores of the fields into parallel arrays of document IDs and scores.
+        Each field is weighted with one array multiplication and added into a dense array
+        indexed by the engine's document positions.
 
         Parameters
         ----------
@@ -117,19 +281,26 @@ class SearchEngine:
             The weights of the fields.
         scores : dict
             The scores of the fields.
-        final_scores : dict
-            The final scores of the documents.
+
+        Returns
+        -------
+        np.ndarray
+            The document IDs.
+        np.ndarray
+            The aggregated score of each document, aligned with the document IDs.
         """
 
-        for field in scores.keys():
-            field_scores = scores[field]
-            w = weights[field]
-            for doc in field_scores.keys():
-                field_scores[doc] *= w
+        doc_scores = np.zeros(len(self._dense_to_docid))
+        scored = np.zeros(len(self._dense_to_docid), dtype=bool)
+        for field, field_scores in scores.items():
+            positions = np.fromiter((self._docid_to_dense[doc] for doc in field_scores), dtype=np.intp,
+                                    count=len(field_scores))
+            # a field scores each document at most once, so the positions are unique and += is safe
+            doc_scores[positions] += np.fromiter(field_scores.values(), dtype=np.float64, count=len(field_scores)) * weights[field]
+            scored[positions] = True
 
-        score1 = self.merge_scores(scores[Indexes.STARS],scores[Indexes.GENRES])
-        final_scores = self.merge_scores(score1,scores[Indexes.SUMMARIES])
-        return final_scores
+        positions = np.flatnonzero(scored)
+        return self._dense_to_docid[positions], doc_scores[positions]
 
 
     def find_scores_with_unsafe_ranking(
@@ -151,16 +322,45 @@ class SearchEngine:
         scores : dict
             The scores of the documents.
         """
-        for field in weights:
+        tiers = ["first_tier", "second_tier", "third_tier"]
+
+        def score_field(field):
+            scorers = [Scorer(self.tiered_index[field].index[tier], self.N, max_score_cache=self.max_score_cache[field][tier])
+                       for tier in tiers]
             field_scores = {}
-            for tier in ["first_tier", "second_tier", "third_tier"]:
-                scorer = Scorer(self.tiered_index[field].index[tier],self.metadata_index.index['document_count'])
+            # the documents found so far for each query term
+            matched = {term: set() for term in query}
+            for i, scorer in enumerate(scorers):
+                # MaxScore over the tiers: a document's posting of a term lies in a single tier, so the lower
+                # tiers raise a document's score by at most the highest scores of the terms it has not matched
+                # yet. Once no document outside the field's top max_results can pass the max_results-th score
+                # that way, the lower tiers only change the scores of the top documents and they are skipped
+                if max_results is not None and len(field_scores) >= max_results:
+                    max_term_scores = {term: 0.0 for term in matched}
+                    for lower in scorers[i:]:
+                        for term, max_score in lower.get_max_query_term_scores(
+                                query, method, self.avgdl[field], self.document_lengths_index[field].index,
+                                quantized=self.quantize_bm25).items():
+                            max_term_scores[term] = max(max_term_scores[term], max_score)
+                    ranked = sorted(field_scores, key=field_scores.get, reverse=True)
+                    kth = field_scores[ranked[max_results - 1]]
+                    if kth >= sum(max_term_scores.values()) and all(
+                            field_scores[doc] + sum(max_score for term, max_score in max_term_scores.items()
+                                                    if doc not in matched[term]) <= kth
+                            for doc in ranked[max_results:]):
+                        break
                 if method == "okapiBM25":
-                    field_scores.update( scorer.compute_socres_with_okapi_bm25(query, self.metadata_index.index[
-                        "averge_document_length"][field.value], self.document_lengths_index[field].index))
+                    tier_scores = scorer.compute_socres_with_okapi_bm25(query, self.avgdl[field], self.document_lengths_index[field].index, quantized=self.quantize_bm25)
                 else:
-                    field_scores.update( scorer.compute_scores_with_vector_space_model(query, method))
-            scores.update({field:field_scores})
+                    tier_scores = scorer.compute_scores_with_vector_space_model(query, method)
+                # a document's postings of different terms can lie in different tiers, so its tier scores add up
+                for doc, score in tier_scores.items():
+                    field_scores[doc] = field_scores.get(doc, 0) + score
+                for term in matched:
+                    matched[term].update(scorer.index.get(term, ()))
+            return field_scores
+
+        scores.update(self.score_fields(score_field, weights))
         return scores
 
     def find_scores_with_safe_ranking(self, query, method, weights, scores):
@@ -179,13 +379,20 @@ class SearchEngine:
             The scores of the documents.
         """
 
-        for field in weights:
-            scorer = Scorer(self.document_indexes[field].index,int(self.metadata_index.index['document_count']))
+        def score_field(field):
+            # a field without any of the query terms scores no documents, so it is not scored at all
+            hit_terms = [term for term in query if term in self.document_indexes[field].index]
+            if not hit_terms:
+                return {}
+            scorer = Scorer(self.document_indexes[field].index, self.N, self.idf_cache[field], self.cf_cache[field],
+                            self.postings_cache[field], self.lengths_cache[field], self.quantized_cache[field],
+                            self.postings_matrices[field])
             if method == "okapiBM25":
-                field_scores = scorer.compute_socres_with_okapi_bm25(query,self.metadata_index.index["averge_document_length"][field.value],self.document_lengths_index[field].index)
-            else:
-                field_scores = scorer.compute_scores_with_vector_space_model(query,method)
-            scores.update({field:field_scores})
+                return scorer.compute_socres_with_okapi_bm25(hit_terms,self.avgdl[field],self.document_lengths_index[field].index,
+                                                             quantized=self.quantize_bm25)
+            return scorer.compute_scores_with_vector_space_model(hit_terms,method)
+
+        scores.update(self.score_fields(score_field, weights))
         return scores
 
     def find_scores_with_unigram_model(
@@ -196,8 +403,8 @@ class SearchEngine:
 
         Parameters
         ----------
-        query : str
-            The query to search for.
+        query : List[str]
+            The terms of the query to search for.
         smoothing_method : str (bayes | naive | mixture)
             The method used for smoothing the probabilities in the unigram model.
         weights : dict
@@ -210,58 +417,46 @@ class SearchEngine:
             The parameter used in some smoothing methods to balance between the document
             probability and the collection probability. Defaults to 0.5.
         """
-        #
-
-        stars_scorer = Scorer(self.document_indexes[Indexes.STARS].index,int(self.metadata_index.index['document_count']))
-        star_scores = stars_scorer.compute_scores_with_unigram_model(query,smoothing_method,self.document_lengths_index[Indexes.STARS].index,alpha,lamda)
-        genres_scorer = Scorer(self.document_indexes[Indexes.GENRES].index,int(self.metadata_index.index['document_count']))
-        genres_scores = genres_scorer.compute_scores_with_unigram_model(query,smoothing_method,self.document_lengths_index[Indexes.GENRES].index,alpha,lamda)
-        summaries_scorer = Scorer(self.document_indexes[Indexes.SUMMARIES].index,int(self.metadata_index.index['document_count']))
-        summaries_scores = summaries_scorer.compute_scores_with_unigram_model(query,smoothing_method,self.document_lengths_index[Indexes.SUMMARIES].index,alpha,lamda)
-        scores = { Indexes.STARS:star_scores, Indexes.GENRES:genres_scores, Indexes.SUMMARIES:summaries_scores}
+        # the fields are scored in one pass over the query terms, each term scoring every field in turn
+        scorers = {
+            field: Scorer(self.document_indexes[field].index, self.N, self.idf_cache[field], self.cf_cache[field])
+            for field in weights
+        }
+        candidates = {
+            field: scorer.get_unigram_candidates(query, self.document_lengths_index[field].index)
+            for field, scorer in scorers.items()
+        }
+        field_scores = {field: np.ones(len(documents)) for field, (documents, _) in candidates.items()}
+        for term in query:
+            for field, scorer in scorers.items():
+                documents, Ld = candidates[field]
+                # a term missing from a field's index has no evidence there and would zero the whole field
+                if documents and term in scorer.index:
+                    field_scores[field] *= scorer.score_term_unigram(term, documents, Ld, self.total_document_length[field],
+                                                                     smoothing_method, alpha, lamda)
+
+        scores = {field: dict(zip(candidates[field][0], field_scores[field].tolist())) for field in weights}
         return scores
 
-
-    def merge_scores(self, scores1, scores2):
+    def score_fields(self, score_field, weights):
         """
-        Merges two dictionaries of scores.
+        Scores the fields of the weights concurrently on the engine's thread pool.
 
         Parameters
         ----------
-        scores1 : dict
-            The first dictionary of scores.
-        scores2 : dict
-            The second dictionary of scores.
+        score_field : callable
+            A function that takes a field and returns the scores of the documents in that field.
+        weights : dict
+            The weights of the fields. Every field in it is scored.
 
         Returns
         -------
         dict
-            The merged dictionary of scores.
+            The scores of each field.
         """
-        if not scores1:
-            if not scores2:
-                return scores1
-            return scores2
-
-
-        scores1 = dict(sorted(scores1.items()))
-        scores2 = dict(sorted(scores2.items()))
-        merged_scores = {}
-        for doc1 in scores1.keys():
-            for doc2 in scores2.keys():
-                if doc1 == doc2:
-                    merged_scores.update({doc1:scores1[doc1]+scores2[doc2]})
-                    break
-                if doc1 < doc2:
-                    merged_scores.update({doc1: scores1[doc1] })
-                    break
-                if doc2 < doc1:
-                    merged_scores.update({doc2:scores2[doc2]})
-        return merged_scores
-
-
-
 
+        futures = {field: self.executor.submit(score_field, field) for field in weights}
+        return {field: future.result() for field, future in futures.items()}
 
 
 if __name__ == "__main__":
@@ -1,12 +1,15 @@
 from typing import List
 
 import requests
-from requests import get
-from bs4 import BeautifulSoup
-from collections import deque
-from concurrent.futures import ThreadPoolExecutor, wait
-from threading import Lock
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from selectolax.lexbor import LexborHTMLParser
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue, Empty
+from threading import Lock, Thread
+import orjson
+import os
+import re
 
 
 class IMDbCrawler:
@@ -17,6 +20,34 @@ class IMDbCrawler:
         'User-Agent': 'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)'
     }
     top_250_URL = 'https://www.imdb.com/chart/top/'
+    number_of_workers = 20
+    # threads that fetch the summary, reviews and review pages of the movies the workers are crawling
+    number_of_fetchers = 40
+    # how long an idle worker waits for a new URL before it stops
+    frontier_timeout = 30
+    # seconds to wait for imdb before a request fails, and the transient statuses that are retried
+    request_timeout = 10
+    retry = Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+    # pages are parsed with lexbor, and the getters query the parsed tree with these css selectors
+    title_links_selector = 'a[href^="/title/"]'
+    review_links_selector = 'a[href^="/review"]'
+    title_selector = '.hero__primary-text'
+    page_data_selector = 'script[type="application/json"]'
+    # pages read only for their embedded json are searched for the script without building a tree
+    page_data_pattern = re.compile(rb'<script[^>]*type="application/json"[^>]*>(.*?)</script>', re.S)
+    review_data_pattern = re.compile(rb'<script[^>]*type="application/ld\+json"[^>]*>(.*?)</script>', re.S)
+    # the key paths of the fields that are read straight out of the page data
+    page_data_paths = {
+        'first_page_summary': ('aboveTheFoldData', 'plot', 'plotText', 'plainText'),
+        'rating': ('aboveTheFoldData', 'ratingsSummary', 'aggregateRating'),
+        'mpaa': ('aboveTheFoldData', 'certificate', 'rating'),
+        'release_year': ('aboveTheFoldData', 'releaseYear', 'year'),
+        'genres': ('aboveTheFoldData', 'genres', 'genres'),
+        'languages': ('mainColumnData', 'spokenLanguages', 'spokenLanguages'),
+        'countries_of_origin': ('mainColumnData', 'countriesOfOrigin', 'countries'),
+        'budget': ('mainColumnData', 'productionBudget', 'budget', 'amount'),
+        'gross_worldwide': ('mainColumnData', 'worldwideGross', 'total', 'amount'),
+    }
 
     def __init__(self, crawling_threshold=1000):
         """
@@ -28,11 +59,20 @@ class IMDbCrawler:
             The number of pages to crawl
         """
         self.crawling_threshold = crawling_threshold
-        self.not_crawled = []
+        self.not_crawled = Queue()
         self.crawled = []
-        self.added_ids = []
+        self.added_ids = set()
+        # crawled movies waiting for the checkpoint writer thread to log them
+        self.checkpoints = Queue()
         self.add_list_lock = None
         self.add_queue_lock = None
+        # one keep-alive connection pool shared by all worker and fetcher threads
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.mount('https://', HTTPAdapter(pool_maxsize=self.number_of_workers + self.number_of_fetchers,
+                                                   max_retries=self.retry))
+        # the workers wait on the fetchers, so they get their own pool instead of sharing the workers'
+        self.fetcher = ThreadPoolExecutor(max_workers=self.number_of_fetchers)
 
     def get_id_from_URL(self, URL):
         """
@@ -48,32 +88,94 @@ class IMDbCrawler:
         str
             The id of the site
         """
-        return URL.split('/')[4]
+        # only the first five pieces are split off, the id is the last of them
+        return URL.split('/', 5)[4]
 
     def write_to_file_as_json(self):
         """
         Save the crawled files into json
         """
-        with open("IMDB_crawled.json",'w') as f :
-            json.dump(self.crawled,f)
-        with open("IMDB_not_crawled.json",'w') as f:
-            json.dump(self.not_crawled,f)
+        IMDbCrawler.write_json_atomically("IMDB_crawled.json", self.crawled)
+        # the log only keeps the movies crawled since the last time the whole list was saved
+        open("IMDB_crawled.jsonl", 'wb').close()
+        self.write_not_crawled_to_file()
+
+    def write_not_crawled_to_file(self):
+        """
+        Save the not crawled URLs into json
+        """
+        with self.not_crawled.mutex:
+            not_crawled = list(self.not_crawled.queue)
+        IMDbCrawler.write_json_atomically("IMDB_not_crawled.json", not_crawled)
+
+    def write_json_atomically(path, data):
+        """
+        Write the data into a temporary file and rename it over the path, so a crash while writing
+        never leaves a truncated file behind
+
+        Parameters
+        ----------
+        path: str
+            The path of the json file
+        data: list
+            The data to save
+        """
+        with open(path + ".tmp", 'wb') as f:
+            f.write(orjson.dumps(data))
+        os.replace(path + ".tmp", path)
+
+    def checkpoint_writer(self):
+        """
+        Append the movies put in the checkpoints queue to the IMDB_crawled.jsonl log, one json line
+        per movie, until a None is put in it. The not crawled URLs are saved every 50 movies.
+        """
+        logged = 0
+        with open("IMDB_crawled.jsonl", 'ab') as log:
+            while True:
+                movie = self.checkpoints.get()
+                if movie is None:
+                    return
+                log.write(orjson.dumps(movie) + b"\n")
+                log.flush()
+                logged += 1
+                if logged % 50 == 0:
+                    print("write")
+                    self.write_not_crawled_to_file()
 
     def read_from_file_as_json(self):
         """
-        Read the crawled files from json
+        Read the crawled files from json, and the movies logged since they were last saved
         """
         try:
-            with open('IMDB_crawled.json', 'r') as f:
-                self.crawled = json.load(f)
+            with open('IMDB_crawled.json', 'rb') as f:
+                self.crawled = orjson.loads(f.read())
         except:
             print("can't read crawled")
         try:
-            with open('IMDB_not_crawled.json', 'r') as f:
-                self.not_crawled = json.load(f)
+            crawled_ids = {movie['id'] for movie in self.crawled}
+            with open('IMDB_crawled.jsonl', 'rb') as f:
+                for line in f:
+                    try:
+                        movie = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        # only the last line can be cut short, by a crash while it was written
+                        break
+                    if movie['id'] not in crawled_ids:
+                        crawled_ids.add(movie['id'])
+                        self.crawled.append(movie)
+        except FileNotFoundError:
+            pass
+        try:
+            with open('IMDB_not_crawled.json', 'rb') as f:
+                not_crawled = orjson.loads(f.read())
         except:
             print("can't read not crawled")
-        self.added_ids = None
+            not_crawled = []
+        self.not_crawled = Queue()
+        for url in not_crawled:
+            self.not_crawled.put(url)
+        self.added_ids = {movie['id'] for movie in self.crawled}
+        self.added_ids.update(self.get_id_from_URL(url) for url in not_crawled)
 
     def crawl(self, URL):
         """
@@ -88,39 +190,33 @@ class IMDbCrawler:
         requests.models.Response
             The response of the get request
         """
-        return get(url=URL, headers=self.headers)
+        return self.session.get(url=URL, timeout=self.request_timeout)
 
     def extract_top_250(self):
         """
         Extract the top 250 movies from the top 250 page and use them as seed for the crawler to start crawling.
         """
         r = self.crawl(self.top_250_URL)
-        soup = BeautifulSoup(r.content, "html.parser")
-        urls = self.get_next_links(soup)
-        self.not_crawled = urls
-        ids = []
+        tree = LexborHTMLParser(r.content)
+        urls = self.get_next_links(tree)
+        self.not_crawled = Queue()
         for url in urls:
-            ids.append(self.get_id_from_URL(url))
-        self.added_ids = ids
+            self.not_crawled.put(url)
+        self.added_ids = {self.get_id_from_URL(url) for url in urls}
 
-    def get_next_links(self,soup,id=None):
-        link_elements = soup.select("a[href]")
+    def get_next_links(self,tree,id=None):
         urls = []
-        for link_element in link_elements:
-            url = link_element['href']
-            if id :
-                if url.startswith("/title") and not(id in url):
-                    split = url.split('/')
-                    urls.append('/' + split[1] + '/' + split[2])
-            else:
-                if url.startswith("/title") :
-                    split = url.split('/')
-                    urls.append('/' + split[1] + '/' + split[2])
-        temp_urls = set(urls)
-        urls = []
-        for url in temp_urls:
-            urls.append("https://www.imdb.com" + url)
+        seen_ids = set()
+        for link_element in tree.css(IMDbCrawler.title_links_selector):
+            url = link_element.attributes['href']
+            if id and id in url:
+                continue
+            url_id = url.split('/', 3)[2]
+            if url_id not in seen_ids:
+                seen_ids.add(url_id)
+                urls.append("https://www.imdb.com/title/" + url_id)
         return urls
+
     def get_imdb_instance(self):
         return {
             'id': None,  # str
@@ -151,21 +247,38 @@ class IMDbCrawler:
         You are free to use it or not. If used, not to forget safe access to the shared resources.
         """
 
-        if len(self.not_crawled) == 0:
+        if self.not_crawled.empty():
             self.extract_top_250()
-        futures = []
-        crawled_counter = 0
         lock = Lock()
-        with ThreadPoolExecutor(max_workers=20) as executor:
-            while len(self.crawled) <= self.crawling_threshold:
-                URL = self.not_crawled.pop(0)
-                futures.append(executor.submit(self.crawl_page_info, URL, lock))
-                if len(self.not_crawled ) == 0:
-                    wait(futures)
-                    futures = []
-            if len(self.crawled) > self.crawling_threshold:
-                print("stop")
-                executor.shutdown(wait=False)
+        writer = Thread(target=self.checkpoint_writer)
+        writer.start()
+        with ThreadPoolExecutor(max_workers=self.number_of_workers) as executor:
+            for _ in range(self.number_of_workers):
+                executor.submit(self.crawl_worker, lock)
+        self.checkpoints.put(None)
+        writer.join()
+        print("stop")
+
+    def crawl_worker(self, lock):
+        """
+        Take URLs from the not crawled queue and crawl them until the crawling threshold is reached
+        or no new URL shows up for frontier_timeout seconds.
+
+        Parameters
+        ----------
+        lock: Lock
+            The lock guarding the crawled list and the added ids
+        """
+        while len(self.crawled) <= self.crawling_threshold:
+            try:
+                URL = self.not_crawled.get(timeout=self.frontier_timeout)
+            except Empty:
+                return
+            try:
+                self.crawl_page_info(URL, lock)
+            except Exception as e:
+                print("failed to crawl", URL, e)
+
     def crawl_page_info(self, URL,lock):
         """
         Main Logic of the crawler. It crawls the page and extracts the information of the movie.
@@ -179,28 +292,26 @@ class IMDbCrawler:
         print("new iteration")
         id = self.get_id_from_URL(URL)
         r = self.crawl(URL)
-        soup = BeautifulSoup(r.content, "html.parser")
-        urls = self.get_next_links(soup,id)
+        tree = LexborHTMLParser(r.content)
+        urls = self.get_next_links(tree,id)
         for url in urls:
-            if (url not in self.not_crawled) and (url not in self.crawled) :
-                lock.acquire()
-                self.not_crawled.append(url)
-                lock.release()
+            url_id = self.get_id_from_URL(url)
+            with lock:
+                if url_id in self.added_ids:
+                    continue
+                self.added_ids.add(url_id)
+            self.not_crawled.put(url)
         movie = self.get_imdb_instance()
         movie['id'] = id
-        self.extract_movie_info(res=r,movie=movie,URL=URL)
-        lock.acquire()
-        self.crawled.append(movie)
-        lock.release()
-        lock.acquire()
-        if len(self.crawled) % 50 == 0:
-            print("write")
-            self.write_to_file_as_json()
-        lock.release()
-        print("not crawled: " , len(self.not_crawled))
+        self.extract_movie_info(res=r,movie=movie,URL=URL,tree=tree)
+        with lock:
+            self.crawled.append(movie)
+        # the writer thread appends the movie to the log, so checkpoints never rewrite the whole list
+        self.checkpoints.put(movie)
+        print("not crawled: " , self.not_crawled.qsize())
         print("crawled: ",len(self.crawled))
 
-    def extract_movie_info(self, res, movie, URL):
+    def extract_movie_info(self, res, movie, URL, tree=None):
         """
         Extract the information of the movie from the response and save it in the movie instance.
 
@@ -212,29 +323,98 @@ class IMDbCrawler:
             The instance of the movie
         URL: str
             The URL of the site
+        tree: LexborHTMLParser
+            The parsed tree of the response, if it is already parsed
+        """
+        # the summary and review pages are fetched while the movie page is being read
+        summary_response = self.fetcher.submit(self.crawl, IMDbCrawler.get_summary_link(URL))
+        review_response = self.fetcher.submit(self.crawl, IMDbCrawler.get_review_link(URL))
+        if tree is None:
+            tree = LexborHTMLParser(res.content)
+        page_data = IMDbCrawler.get_page_data(tree)
+        movie['title'] = IMDbCrawler.get_title(tree)
+        movie['first_page_summary'] = IMDbCrawler.get_first_page_summary(page_data)
+        movie['release_year'] = str(IMDbCrawler.get_release_year(page_data))
+        movie['mpaa'] = IMDbCrawler.get_mpaa(page_data)
+        movie['budget'] = str(IMDbCrawler.get_budget(page_data))
+        movie['gross_worldwide'] = str(IMDbCrawler.get_gross_worldwide(page_data))
+        movie['directors'] = IMDbCrawler.get_director(page_data)
+        movie['writers'] = IMDbCrawler.get_writers(page_data)
+        movie['stars'] = IMDbCrawler.get_stars(page_data)
+        movie['related_links'] = self.get_related_links(tree)
+        movie['genres'] = IMDbCrawler.get_genres(page_data)
+        movie['languages'] = IMDbCrawler.get_languages(page_data)
+        movie['countries_of_origin'] = IMDbCrawler.get_countries_of_origin(page_data)
+        movie['rating'] = str(IMDbCrawler.get_rating(page_data))
+        summary_page_data = IMDbCrawler.get_page_data_from_content(summary_response.result().content)
+        movie['summaries'] = IMDbCrawler.get_summary(summary_page_data)
+        movie['synopsis'] = IMDbCrawler.get_synopsis(summary_page_data)
+        review_tree = LexborHTMLParser(review_response.result().content)
+        movie['reviews'] = self.get_reviews_with_scores(review_tree)
+
+    def get_page_data(tree):
+        """
+        Parse the JSON data embedded in the page once, so the getters can share it
+
+        Parameters
+        ----------
+        tree: LexborHTMLParser
+            The parsed tree of the page
+        Returns
+        ----------
+        dict
+            The page props of the page
+        """
+        try:
+            return orjson.loads(tree.css_first(IMDbCrawler.page_data_selector).text())['props']['pageProps']
+        except:
+            print("failed to get page data")
+            return None
+
+    def dig(page_data, field):
+        """
+        Follow the key path of a field into the page data
+
+        Parameters
+        ----------
+        page_data: dict
+            The parsed page props of the page
+        field: str
+            The field, a key of page_data_paths
+        Returns
+        ----------
+        Any
+            The value of the field, or None if any key on its path is missing
+        """
+        value = page_data
+        for key in IMDbCrawler.page_data_paths[field]:
+            if value is None:
+                return None
+            value = value.get(key)
+        return value
+
+    def get_page_data_from_content(content):
+        """
+        Get the page data straight from the bytes of a page whose only use is its embedded JSON,
+        falling back to parsing the page if the script is not found
+
+        Parameters
+        ----------
+        content: bytes
+            The content of the response
+        Returns
+        ----------
+        dict
+            The page props of the page
         """
-        soup = BeautifulSoup(res.content, "html.parser")
-        movie['title'] = IMDbCrawler.get_title(soup)
-        movie['first_page_summary'] = IMDbCrawler.get_first_page_summary(soup)
-        movie['release_year'] = str(IMDbCrawler.get_release_year(soup))
-        movie['mpaa'] = IMDbCrawler.get_mpaa(soup)
-        movie['budget'] = str(IMDbCrawler.get_budget(soup))
-        movie['gross_worldwide'] = str(IMDbCrawler.get_gross_worldwide(soup))
-        movie['directors'] = IMDbCrawler.get_director(soup)
-        movie['writers'] = IMDbCrawler.get_writers(soup)
-        movie['stars'] = IMDbCrawler.get_stars(soup)
-        movie['related_links'] = self.get_related_links(soup)
-        movie['genres'] = IMDbCrawler.get_genres(soup)
-        movie['languages'] = IMDbCrawler.get_languages(soup)
-        movie['countries_of_origin'] = IMDbCrawler.get_countries_of_origin(soup)
-        movie['rating'] = str(IMDbCrawler.get_rating(soup))
-        summary_url = IMDbCrawler.get_summary_link(URL)
-        summary_soup = BeautifulSoup(self.crawl(summary_url).content, 'html.parser')
-        movie['summaries'] = IMDbCrawler.get_summary(summary_soup)
-        movie['synopsis'] = IMDbCrawler.get_synopsis(summary_soup)
-        review_url = IMDbCrawler.get_review_link(URL)
-        review_soup = BeautifulSoup(self.crawl(review_url).content, 'html.parser')
-        movie['reviews'] = self.get_reviews_with_scores(review_soup)
+        match = IMDbCrawler.page_data_pattern.search(content)
+        if match is None:
+            return IMDbCrawler.get_page_data(LexborHTMLParser(content))
+        try:
+            return orjson.loads(match.group(1))['props']['pageProps']
+        except:
+            print("failed to get page data")
+            return None
 
     def get_summary_link(url):
         """
@@ -252,11 +432,7 @@ class IMDbCrawler:
         str
             The URL of the summary page
         """
-        try:
-            return url + "/plotsummary"
-        except:
-            print("failed to get summary link")
-            return None
+        return url + "/plotsummary"
 
     def get_review_link(url:str):
         """
@@ -265,20 +441,16 @@ class IMDbCrawler:
         https://www.imdb.com/title/tt0111161/ is the page
         https://www.imdb.com/title/tt0111161/reviews is the review page
         """
-        try:
-            return url + "/reviews"
-        except:
-            print("failed to get review link")
-            return None
+        return url + "/reviews"
 
-    def get_title(soup):
+    def get_title(tree):
         """
-        Get the title of the movie from the soup
+        Get the title of the movie from the tree
 
         Parameters
         ----------
-        soup: BeautifulSoup
-            The soup of the page
+        tree: LexborHTMLParser
+            The parsed tree of the page
         Returns
         ----------
         str
@@ -286,45 +458,44 @@ class IMDbCrawler:
 
         """
         try:
-            return soup.select_one('.hero__primary-text').string
+            return tree.css_first(IMDbCrawler.title_selector).text()
         except:
             print("failed to get title")
             return None
 
-    def get_first_page_summary(soup):
+    def get_first_page_summary(page_data):
         """
-        Get the first page summary of the movie from the soup
+        Get the first page summary of the movie from the page data
 
         Parameters
         ----------
-        soup: BeautifulSoup
-            The soup of the page
+        page_data: dict
+            The parsed page props of the page
         Returns
         ----------
         str
             The first page summary of the movie
         """
-        try:
-            return json.loads(soup.find('script', type='application/json').string)['props']['pageProps']['aboveTheFoldData']['plot']['plotText']['plainText']
-        except:
+        first_page_summary = IMDbCrawler.dig(page_data, 'first_page_summary')
+        if first_page_summary is None:
             print("failed to get first page summary")
-            return None
+        return first_page_summary
 
-    def get_director(soup):
+    def get_director(page_data):
         """
-        Get the directors of the movie from the soup
+        Get the directors of the movie from the page data
 
         Parameters
         ----------
-        soup: BeautifulSoup
-            The soup of the page
+        page_data: dict
+            The parsed page props of the page
         Returns
         ----------
         List[str]
             The directors of the movie
         """
         try:
-            credits_raw = json.loads(soup.find('script', type='application/json').string)['props']['pageProps']['aboveTheFoldData']['principalCredits']
+            credits_raw = page_data['aboveTheFoldData']['principalCredits']
             directors = []
             for credit in credits_raw:
                 if credit['category']['text'] == 'Directors' or credit['category']['text'] == 'Director':
@@ -335,21 +506,21 @@ class IMDbCrawler:
             print("failed to get director")
             return None
 
-    def get_stars(soup):
+    def get_stars(page_data):
         """
-        Get the stars of the movie from the soup
+        Get the stars of the movie from the page data
 
         Parameters
         ----------
-        soup: BeautifulSoup
-            The soup of the page
+        page_data: dict
+            The parsed page props of the page
         Returns
         ----------
         List[str]
             The stars of the movie
         """
         try:
-            credits_raw = json.loads(soup.find('script', type='application/json').string)['props']['pageProps']['aboveTheFoldData']['principalCredits']
+            credits_raw = page_data['aboveTheFoldData']['principalCredits']
             stars = []
             for credit in credits_raw:
                 if credit['category']['text'] == 'Stars' or credit['category']['text'] == 'Star':
@@ -360,21 +531,21 @@ class IMDbCrawler:
             print("failed to get stars")
             return None
 
-    def get_writers(soup):
+    def get_writers(page_data):
         """
-        Get the writers of the movie from the soup
+        Get the writers of the movie from the page data
 
         Parameters
         ----------
-        soup: BeautifulSoup
-            The soup of the page
+        page_data: dict
+            The parsed page props of the page
         Returns
         ----------
         List[str]
             The writers of the movie
         """
         try:
-            credits_raw = json.loads(soup.find('script', type='application/json').string)['props']['pageProps']['aboveTheFoldData']['principalCredits']
+            credits_raw = page_data['aboveTheFoldData']['principalCredits']
             writers = []
             for credit in credits_raw:
                 if credit['category']['text'] == 'Writers' or credit['category']['text'] == 'Writer':
@@ -385,40 +556,40 @@ class IMDbCrawler:
             print("failed to get writers")
             return None
 
-    def get_related_links(self,soup):
+    def get_related_links(self,tree):
         """
-        Get the related links of the movie from the More like this section of the page from the soup
+        Get the related links of the movie from the More like this section of the page from the tree
 
         Parameters
         ----------
-        soup: BeautifulSoup
-            The soup of the page
+        tree: LexborHTMLParser
+            The parsed tree of the page
         Returns
         ----------
         List[str]
             The related links of the movie
         """
         try:
-            return self.get_next_links(soup)
+            return self.get_next_links(tree)
         except:
             print("failed to get related links")
             return None
 
-    def get_summary(soup):
+    def get_summary(page_data):
         """
-        Get the summary of the movie from the soup
+        Get the summary of the movie from the page data
 
         Parameters
         ----------
-        soup: BeautifulSoup
-            The soup of the page
+        page_data: dict
+            The parsed page props of the page
         Returns
         ----------
         List[str]
             The summary of the movie
         """
         try:
-            summaries_and_synopsis = json.loads(soup.find('script', type='application/json').string)['props']['pageProps']['contentData']['categories']
+            summaries_and_synopsis = page_data['contentData']['categories']
             summaries = []
             for s in summaries_and_synopsis:
                 if s['name'] == "Summaries":
@@ -430,21 +601,21 @@ class IMDbCrawler:
             print("failed to get summary")
             return None
 
-    def get_synopsis(soup):
+    def get_synopsis(page_data):
         """
-        Get the synopsis of the movie from the soup
+        Get the synopsis of the movie from the page data
 
         Parameters
         ----------
-        soup: BeautifulSoup
-            The soup of the page
+        page_data: dict
+            The parsed page props of the page
         Returns
         ----------
         List[str]
             The synopsis of the movie
         """
         try:
-            summaries_and_synopsis = json.loads(soup.find('script', type='application/json').string)['props']['pageProps']['contentData']['categories']
+            summaries_and_synopsis = page_data['contentData']['categories']
             synopsis = []
             for s in summaries_and_synopsis:
                 if s['name'] == "Synopsis":
@@ -456,25 +627,25 @@ class IMDbCrawler:
             print("failed to get synopsis")
             return None
 
-    def get_reviews_with_scores(self,soup):
+    def get_reviews_with_scores(self,tree):
         """
-        Get the reviews of the movie from the soup
+        Get the reviews of the movie from the tree
         reviews structure: [[review,score]]
 
         Parameters
         ----------
-        soup: BeautifulSoup
-            The soup of the page
+        tree: LexborHTMLParser
+            The parsed tree of the page
         Returns
         ----------
         List[List[str]]
             The reviews of the movie
         """
         try:
-            link_elements = soup.select("a[href]")
+            link_elements = tree.css(IMDbCrawler.review_links_selector)
             urls = []
             for link_element in link_elements:
-                url = link_element['href']
+                url = link_element.attributes['href']
                 if url.startswith("/review") :
                     split = url.split('/')
                     urls.append('/' + split[1] + '/' + split[2])
@@ -483,12 +654,15 @@ class IMDbCrawler:
             for url in temp_urls:
                 urls.append("https://www.imdb.com" + url)
             urls = urls[:10]
-            reviews = List[List[str]]
-            for url in  urls:
-                review_entry = List[str]
-                r = self.crawl(url)
-                review_soup = BeautifulSoup(r.content,"html.parser")
-                review_data = json.loads(review_soup.find('script', type='application/ld+json').string)
+            reviews = []
+            for r in self.fetcher.map(self.crawl, urls):
+                review_entry = []
+                # a review page without the embedded review is skipped, the others are still kept
+                match = IMDbCrawler.review_data_pattern.search(r.content)
+                if match is None:
+                    print("failed to get review")
+                    continue
+                review_data = orjson.loads(match.group(1))
                 try:
                     review = review_data['reviewBody']
                 except:
@@ -505,169 +679,152 @@ class IMDbCrawler:
             print("failed to get reviews")
             return None
 
-    def get_genres(soup):
+    def get_genres(page_data):
         """
-        Get the genres of the movie from the soup
+        Get the genres of the movie from the page data
 
         Parameters
         ----------
-        soup: BeautifulSoup
-            The soup of the page
+        page_data: dict
+            The parsed page props of the page
         Returns
         ----------
         List[str]
             The genres of the movie
         """
-        try:
-            genres_raw = json.loads(soup.find('script', type='application/json').string)['props']['pageProps']['aboveTheFoldData']['genres']['genres']
-            genres = []
-            for g in genres_raw:
-                genres.append(g['text'])
-            return genres
-        except:
+        genres_raw = IMDbCrawler.dig(page_data, 'genres')
+        if genres_raw is None:
             print("Failed to get generes")
             return None
+        return [g['text'] for g in genres_raw]
 
-    def get_rating(soup):
+    def get_rating(page_data):
         """
-        Get the rating of the movie from the soup
+        Get the rating of the movie from the page data
 
         Parameters
         ----------
-        soup: BeautifulSoup
-            The soup of the page
+        page_data: dict
+            The parsed page props of the page
         Returns
         ----------
         str
             The rating of the movie
         """
-        try:
-            return json.loads(soup.find('script',type='application/json').string)['props']['pageProps']['aboveTheFoldData']['ratingsSummary']['aggregateRating']
-        except:
+        rating = IMDbCrawler.dig(page_data, 'rating')
+        if rating is None:
             print("failed to get rating")
-            return None
+        return rating
 
-    def get_mpaa(soup):
+    def get_mpaa(page_data):
         """
-        Get the MPAA of the movie from the soup
+        Get the MPAA of the movie from the page data
 
         Parameters
         ----------
-        soup: BeautifulSoup
-            The soup of the page
+        page_data: dict
+            The parsed page props of the page
         Returns
         ----------
         str
             The MPAA of the movie
         """
-        try:
-            return json.loads(soup.find('script',type='application/json').string)['props']['pageProps']['aboveTheFoldData']['certificate']['rating']
-        except:
+        mpaa = IMDbCrawler.dig(page_data, 'mpaa')
+        if mpaa is None:
             print("failed to get mpaa")
-            return None
+        return mpaa
 
-    def get_release_year(soup):
+    def get_release_year(page_data):
         """
-        Get the release year of the movie from the soup
+        Get the release year of the movie from the page data
 
         Parameters
         ----------
-        soup: BeautifulSoup
-            The soup of the page
+        page_data: dict
+            The parsed page props of the page
         Returns
         ----------
         str
             The release year of the movie
         """
-        try:
-            return json.loads(soup.find('script',type='application/json').string)['props']['pageProps']['aboveTheFoldData']['releaseYear']['year']
-        except:
+        release_year = IMDbCrawler.dig(page_data, 'release_year')
+        if release_year is None:
             print("failed to get release year")
-            return None
+        return release_year
 
-    def get_languages(soup):
+    def get_languages(page_data):
         """
-        Get the languages of the movie from the soup
+        Get the languages of the movie from the page data
 
         Parameters
         ----------
-        soup: BeautifulSoup
-            The soup of the page
+        page_data: dict
+            The parsed page props of the page
         Returns
         ----------
         List[str]
             The languages of the movie
         """
-        try:
-            languages_raw = json.loads(soup.find('script', type='application/json').string)['props']['pageProps']['mainColumnData']['spokenLanguages']['spokenLanguages']
-            languages = []
-            for l in languages_raw:
-                languages.append(l['text'])
-            return languages
-        except:
+        languages_raw = IMDbCrawler.dig(page_data, 'languages')
+        if languages_raw is None:
             print("failed to get languages")
             return None
+        return [l['text'] for l in languages_raw]
 
-    def get_countries_of_origin(soup):
+    def get_countries_of_origin(page_data):
         """
-        Get the countries of origin of the movie from the soup
+        Get the countries of origin of the movie from the page data
 
         Parameters
         ----------
-        soup: BeautifulSoup
-            The soup of the page
+        page_data: dict
+            The parsed page props of the page
         Returns
         ----------
         List[str]
             The countries of origin of the movie
         """
-        try:
-            countries_raw = json.loads(soup.find('script', type='application/json').string)['props']['pageProps']['mainColumnData']['countriesOfOrigin']['countries']
-            countries = []
-            for c in countries_raw:
-                countries.append(c['text'])
-            return countries
-        except:
+        countries_raw = IMDbCrawler.dig(page_data, 'countries_of_origin')
+        if countries_raw is None:
             print("failed to get countries of origin")
             return None
+        return [c['text'] for c in countries_raw]
 
-    def get_budget(soup):
+    def get_budget(page_data):
         """
-        Get the budget of the movie from box office section of the soup
+        Get the budget of the movie from box office section of the page data
 
         Parameters
         ----------
-        soup: BeautifulSoup
-            The soup of the page
+        page_data: dict
+            The parsed page props of the page
         Returns
         ----------
         str
             The budget of the movie
         """
-        try:
-            return json.loads(soup.find('script', type='application/json').string)['props']['pageProps']['mainColumnData']['productionBudget']['budget']['amount']
-        except:
+        budget = IMDbCrawler.dig(page_data, 'budget')
+        if budget is None:
             print("failed to get budget")
-            return None
+        return budget
 
-    def get_gross_worldwide(soup):
+    def get_gross_worldwide(page_data):
         """
-        Get the gross worldwide of the movie from box office section of the soup
+        Get the gross worldwide of the movie from box office section of the page data
 
         Parameters
         ----------
-        soup: BeautifulSoup
-            The soup of the page
+        page_data: dict
+            The parsed page props of the page
         Returns
         ----------
         str
             The gross worldwide of the movie
         """
-        try:
-            return json.loads(soup.find('script', type='application/json').string)['props']['pageProps']['mainColumnData']['worldwideGross']['total']['amount']
-        except:
+        gross_worldwide = IMDbCrawler.dig(page_data, 'gross_worldwide')
+        if gross_worldwide is None:
             print("failed to get gross worldwide")
-            return None
+        return gross_worldwide
 
 
 def main():
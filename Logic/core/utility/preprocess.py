@@ -1,9 +1,18 @@
 import nltk
+import os
 import re
+from functools import lru_cache
+from multiprocessing import Pool
+from pathlib import Path
 
 class Preprocessor:
+    # links, domains and emails are removed in one pass, and runs of punctuation are matched as one
+    link_pattern = re.compile(r'\S*(?:http|www|@)\S*|\S+\.(?:ir|com|org)\S*')
+    punctuation_pattern = re.compile(r'[^\w\s]+')
+    # the punctuation is already removed when the text is tokenized, so tokens are just runs of word characters
+    token_pattern = re.compile(r'\w+')
 
-    def __init__(self, documents: list):
+    def __init__(self, documents: list, stopwords: list = None):
         """
         Initialize the class.
 
@@ -11,38 +20,84 @@ class Preprocessor:
         ----------
         documents : list
             The list of documents to be preprocessed, path to stop words, or other parameters.
+        stopwords : list, optional
+            The stop words. If None they are read from stopwords.txt.
         """
         #nltk.download('punkt')
         #nltk.download('wordnet')
         #nltk.download('omw-1.4')
         self.documents = documents
-        stopwords = []
-        with open("C:/Users/ASUS/PycharmProjects/MIR-project/Logic/core/utility/stopwords.txt",'r') as f :
-            for w in f:
-                if w.endswith("\n"):
-                    w = w.removesuffix("\n")
-                stopwords.append(w)
-            f.close()
-        self.stopwords = stopwords
-
-    def preprocess(self):
+        self.lemmatizer = nltk.stem.WordNetLemmatizer()
+        # the vocabulary is small next to the number of tokens, so most lemmas are looked up only once
+        self.lemmatize = lru_cache(maxsize=200_000)(self.lemmatizer.lemmatize)
+        if stopwords is not None:
+            self.stopwords = frozenset(w.lower() for w in stopwords)
+            return
+        with open(Path(__file__).resolve().parent / "stopwords.txt",'r') as f :
+            self.stopwords = frozenset(w.strip().lower() for w in f)
+
+    def preprocess(self, num_workers: int = 1):
         """
         Preprocess the text using the methods in the class.
 
+        Parameters
+        ----------
+        num_workers : int
+            The number of processes to preprocess the documents with. Each worker builds its own
+            Preprocessor once, and the documents are sent to the workers in chunks. If None, one
+            process per CPU is used.
+
         Returns
         ----------
         List[str]
             The preprocessed documents.
         """
-        preprocessed_documents = []
-        if self.documents:
-            for document in self.documents:
-                pre_document = self.remove_links(document)
-                pre_document = self.remove_punctuations(pre_document)
-                pre_document = self.normalize(pre_document)
-                preprocessed_documents.append(pre_document)
-            return preprocessed_documents
-        return self.documents
+        if not self.documents:
+            return self.documents
+        if num_workers is None:
+            num_workers = os.cpu_count() or 1
+        if num_workers > 1:
+            with Pool(num_workers, initializer=_init_worker, initargs=(self.stopwords,)) as pool:
+                return list(pool.imap(_preprocess_in_worker, self.documents, chunksize=64))
+        return [self.preprocess_document(document) for document in self.documents]
+
+    def preprocess_document(self, document: str):
+        """
+        Preprocess a single document.
+
+        Parameters
+        ----------
+        document : str
+            The document to be preprocessed.
+
+        Returns
+        ----------
+        str
+            The preprocessed document.
+        """
+        pre_document = self.remove_links(document)
+        pre_document = self.remove_punctuations(pre_document)
+        pre_document = self.normalize(pre_document)
+        return pre_document
+
+    def preprocess_tokens(self, text: str):
+        """
+        Preprocess a single text like preprocess_document, but return its tokens instead of
+        joining them back into a string.
+
+        Parameters
+        ----------
+        text : str
+            The text to be preprocessed.
+
+        Returns
+        ----------
+        List[str]
+            The preprocessed tokens.
+        """
+        pre_text = self.remove_links(text)
+        pre_text = self.remove_punctuations(pre_text)
+        return self.normalize_tokens(pre_text)
 
     def normalize(self, text: str):
         """
@@ -58,12 +113,25 @@ class Preprocessor:
         str
             The normalized text.
         """
-        lemmatizer = nltk.stem.WordNetLemmatizer()
-        tokenized_text = self.remove_stopwords(text)
-        lemmatized_list = [lemmatizer.lemmatize(word) for word in tokenized_text]
-        lemmatized_text = ' '.join(lemmatized_list)
-        lemmatized_text = lemmatized_text.lower()
-        return lemmatized_text
+        return ' '.join(self.normalize_tokens(text))
+
+    def normalize_tokens(self, text: str):
+        """
+        Lower case and tokenize the text, remove its stopwords and lemmatize the remaining tokens.
+
+        Parameters
+        ----------
+        text : str
+            The text to be normalized.
+
+        Returns
+        ----------
+        List[str]
+            The normalized tokens.
+        """
+        # the text is lower cased first, so capitalized stopwords are removed too
+        tokenized_text = self.remove_stopwords(text.lower())
+        return [self.lemmatize(word) for word in tokenized_text]
 
     def remove_links(self, text: str):
         """
@@ -79,10 +147,7 @@ class Preprocessor:
         str
             The text with links removed.
         """
-        patterns = [r'\S*http\S*', r'\S*www\S*', r'\S+\.ir\S*', r'\S+\.com\S*', r'\S+\.org\S*', r'\S*@\S*']
-        for pattern in patterns:
-            text = re.sub(pattern,'',text)
-        return text
+        return Preprocessor.link_pattern.sub('', text)
 
     def remove_punctuations(self, text: str):
         """
@@ -98,9 +163,7 @@ class Preprocessor:
         str
             The text with punctuations removed.
         """
-        pattern = r'[^\w\s]'
-        text = re.sub(pattern,'',text)
-        return text
+        return Preprocessor.punctuation_pattern.sub('', text)
 
     def tokenize(self, text: str):
         """
@@ -116,8 +179,7 @@ class Preprocessor:
         list
             The list of words.
         """
-        tokens = nltk.word_tokenize(text)
-        return tokens
+        return Preprocessor.token_pattern.findall(text)
 
     def remove_stopwords(self, text: str):
         """
@@ -137,3 +199,14 @@ class Preprocessor:
         clean_words = [ word for word in words if word not in self.stopwords ]
         return clean_words
 
+
+_worker_preprocessor = None
+
+
+def _init_worker(stopwords):
+    global _worker_preprocessor
+    _worker_preprocessor = Preprocessor([], stopwords)
+
+
+def _preprocess_in_worker(document):
+    return _worker_preprocessor.preprocess_document(document)
@@ -1,9 +1,205 @@
 import math
+from functools import lru_cache
+from pathlib import Path
 
 import numpy as np
+import scipy.sparse as sp
+
+
+def _log_tf(weights, idfs):
+    return np.where(weights > 0, 1 + np.log(np.where(weights > 0, weights, 1)), 0.0)
+
+
+def _idf(weights, idfs):
+    return weights * idfs
+
+
+def _cosine(weights, idfs):
+    norms = np.linalg.norm(weights, axis=1, keepdims=True)
+    return np.divide(weights, norms, out=np.zeros_like(weights), where=norms > 0)
+
+
+@lru_cache(maxsize=16)
+def _compile_smart_weights(method):
+    """
+    Composes the weighting of a SMART notation once, so the notation is not interpreted on every call.
+
+    Parameters
+    ----------
+    method : str (n|l)(n|t)(n|c)
+        The tf, idf and normalization letters of the method.
+
+    Returns
+    -------
+    function
+        A function of a tf matrix and the idfs of its columns, returning the weighted matrix.
+    """
+    if len(method) != 3 or method[0] not in 'nl' or method[1] not in 'nt' or method[2] not in 'nc':
+        raise ValueError(f"Invalid SMART notation {method!r}, expected (n|l)(n|t)(n|c)")
+    transforms = tuple(transform for letter, transform in zip(method, (_log_tf, _idf, _cosine)) if letter != 'n')
+
+    def weigh(tfs, idfs):
+        weights = tfs
+        for transform in transforms:
+            weights = transform(weights, idfs)
+        return weights
+
+    return weigh
+
+
+def _bm25_kernel(rows, idfs, indptr, indices, data, Ld, avgdl, k1, b, out):
+    """
+    Adds the BM25 scores of the rows of a CSR term-document matrix to the scores of their documents.
+
+    Parameters
+    ----------
+    rows : np.ndarray
+        The rows of the query terms.
+    idfs : np.ndarray
+        The idf of each query term.
+    indptr, indices, data : np.ndarray
+        The arrays of the CSR matrix.
+    Ld : np.ndarray
+        The length of each document, one per column.
+    avgdl : float
+        The average length of the documents.
+    k1 : float
+        The tf saturation parameter.
+    b : float
+        The document length normalization parameter.
+    out : np.ndarray
+        The scores of the documents, one per column, added to in place.
+    """
+    starts = indptr[rows]
+    counts = indptr[rows + 1] - starts
+    # the positions of all the postings of the rows, walked as one flat slice
+    positions = np.arange(counts.sum()) + np.repeat(starts - np.cumsum(counts) + counts, counts)
+    docs = indices[positions]
+    f = data[positions]
+    contributions = np.repeat(idfs, counts) * f * (k1 + 1) / (f + k1 * (1 - b + b * Ld[docs] / avgdl))
+    out += np.bincount(docs, weights=contributions, minlength=len(out))
+
+
+class PostingsMatrix:
+    def __init__(self, index):
+        """
+        Lays the posting lists of an index out as a CSR matrix with one row per term and one column
+        per document, holding the tfs.
+
+        Parameters
+        ----------
+        index : dict
+            The index to lay out.
+        """
+
+        self.term_rows = {term: row for row, term in enumerate(index)}
+        self.doc_ids = np.array(sorted({doc for posting in index.values() for doc in posting}))
+        doc_columns = {doc: column for column, doc in enumerate(self.doc_ids.tolist())}
+        indptr = np.zeros(len(index) + 1, dtype=np.int64)
+        np.cumsum([len(posting) for posting in index.values()], out=indptr[1:])
+        indices = np.fromiter((doc_columns[doc] for posting in index.values() for doc in posting), dtype=np.int32,
+                              count=indptr[-1])
+        data = np.fromiter((tf for posting in index.values() for tf in posting.values()), dtype=np.float64,
+                           count=indptr[-1])
+        self.matrix = sp.csr_matrix((data, indices, indptr), shape=(len(index), len(self.doc_ids)))
+        self._document_lengths = (None, None)
+
+    def save(self, path):
+        """
+        Stores the matrix as raw .npy arrays in a directory, so it can be loaded with load.
+
+        Parameters
+        ----------
+        path : str
+            The directory to store the arrays in.
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "indptr.npy", self.matrix.indptr)
+        np.save(path / "indices.npy", self.matrix.indices)
+        np.save(path / "data.npy", self.matrix.data)
+        np.save(path / "doc_ids.npy", self.doc_ids)
+        np.save(path / "terms.npy", np.array(list(self.term_rows)))
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Loads a matrix stored with save.
+
+        Parameters
+        ----------
+        path : str
+            The directory the arrays are stored in.
+        mmap : bool, optional
+            If True, the postings arrays are memory-mapped read only instead of read, so processes
+            loading the same matrix share its pages and no posting is copied. Defaults to True.
+
+        Returns
+        -------
+        PostingsMatrix
+            The loaded matrix.
+        """
+        path = Path(path)
+        mmap_mode = 'r' if mmap else None
+        postings_matrix = cls.__new__(cls)
+        postings_matrix.term_rows = {term: row for row, term in enumerate(np.load(path / "terms.npy").tolist())}
+        postings_matrix.doc_ids = np.load(path / "doc_ids.npy")
+        postings_matrix.matrix = sp.csr_matrix(
+            (np.load(path / "data.npy", mmap_mode=mmap_mode), np.load(path / "indices.npy", mmap_mode=mmap_mode),
+             np.load(path / "indptr.npy", mmap_mode=mmap_mode)),
+            shape=(len(postings_matrix.term_rows), len(postings_matrix.doc_ids)), copy=False)
+        postings_matrix._document_lengths = (None, None)
+        return postings_matrix
+
+    def get_document_lengths(self, document_lengths):
+        """
+        Returns the document lengths as an array aligned with the columns of the matrix.
+
+        Parameters
+        ----------
+        document_lengths : dict
+            A dictionary of the document lengths. The keys are the document IDs, and the values are
+            the document's length in that field.
+
+        Returns
+        -------
+        np.ndarray
+            The length of each document, one per column.
+        """
+        source, lengths = self._document_lengths
+        if source is not document_lengths:
+            lengths = np.fromiter((document_lengths[doc] for doc in self.doc_ids.tolist()), dtype=np.float64,
+                                  count=len(self.doc_ids))
+            self._document_lengths = (document_lengths, lengths)
+        return lengths
+
+    def get_tf_matrix(self, terms):
+        """
+        Returns the documents that contain at least one of the terms, with the tfs of the terms in them.
+
+        Parameters
+        ----------
+        terms : List[str]
+            The terms, one column each.
+
+        Returns
+        -------
+        list
+            The documents, one row each.
+        np.ndarray
+            A (len(documents), len(terms)) matrix of the tf of each term in each document.
+        """
+        present = [j for j, term in enumerate(terms) if term in self.term_rows]
+        rows = self.matrix[[self.term_rows[terms[j]] for j in present]]
+        columns = np.unique(rows.indices)
+        tfs = np.zeros((len(columns), len(terms)))
+        tfs[:, present] = rows[:, columns].T.toarray()
+        return self.doc_ids[columns].tolist(), tfs
+
 
 class Scorer:    
-    def __init__(self, index, number_of_documents):
+    def __init__(self, index, number_of_documents, idf_cache=None, cf_cache=None, postings_cache=None,
+                 lengths_cache=None, quantized_cache=None, postings_matrix=None, max_score_cache=None):
         """
         Initializes the Scorer.
 
@@ -13,11 +209,33 @@ class Scorer:
             The index to score the documents with.
         number_of_documents : int
             The number of documents in the index.
+        idf_cache : dict, optional
+            A dict of already computed idfs of this index, shared between scorers of the same index.
+        cf_cache : dict, optional
+            A dict of already computed collection frequencies of this index, shared like idf_cache.
+        postings_cache : dict, optional
+            A dict of posting lists of this index already converted to arrays, shared like idf_cache.
+        lengths_cache : dict, optional
+            A dict of document length arrays aligned with the posting arrays, shared like idf_cache.
+        quantized_cache : dict, optional
+            A dict of already quantized BM25 scores of the posting lists, shared like idf_cache.
+        postings_matrix : PostingsMatrix, optional
+            The index laid out as a term-document matrix. If given, the vector space, unigram and
+            unquantized BM25 models read their candidate documents and tfs from it instead of the
+            posting dicts.
+        max_score_cache : dict, optional
+            A dict of the already computed highest scores of the terms of this index, shared like idf_cache.
         """
 
         self.index = index
-        self.idf = {}
+        self.idf = idf_cache if idf_cache is not None else {}
+        self.cf = cf_cache if cf_cache is not None else {}
+        self.postings = postings_cache if postings_cache is not None else {}
+        self.posting_lengths = lengths_cache if lengths_cache is not None else {}
+        self.quantized = quantized_cache if quantized_cache is not None else {}
+        self.max_scores = max_score_cache if max_score_cache is not None else {}
         self.N = number_of_documents
+        self.postings_matrix = postings_matrix
 
     def get_list_of_documents(self,query):
         """
@@ -41,11 +259,11 @@ class Scorer:
                 Then, we could iterate through the lists in parallel.
             
         """
-        list_of_documents = []
+        documents = set()
         for term in query:
-            if term in self.index.keys():
-                list_of_documents.extend(self.index[term].keys())
-        return list(set(list_of_documents))
+            if term in self.index:
+                documents.update(self.index[term])
+        return list(documents)
     
     def get_idf(self, term):
         """
@@ -63,17 +281,227 @@ class Scorer:
         
         Note
         -------
-            It was better to store dfs in a separate dict in preprocessing.
+            A term that is not in the index has an idf of 0, so it adds nothing to the scores.
         """
         idf = self.idf.get(term, None)
         if idf is None:
-            list_of_documents = []
-            if term in self.index.keys():
-                list_of_documents.extend(self.index[term].keys())
-            df = len(list_of_documents)
+            df = len(self.index.get(term, ()))
+            if df == 0:
+                return 0.0
             idf = math.log(self.N/df)
+            self.idf[term] = idf
         return idf
+
+    def get_cf(self, term):
+        """
+        Returns the collection frequency of a term, the sum of its tfs over all documents.
+
+        Parameters
+        ----------
+        term : str
+            The term to get the collection frequency for.
+
+        Returns
+        -------
+        int
+            The collection frequency of the term.
+        """
+        cf = self.cf.get(term, None)
+        if cf is None:
+            cf = sum(self.index.get(term, {}).values())
+            self.cf[term] = cf
+        return cf
     
+    def get_postings_arrays(self, term):
+        """
+        Returns the posting list of a term as parallel arrays of document IDs and tfs.
+
+        Parameters
+        ----------
+        term : str
+            The term to get the posting list for.
+
+        Returns
+        -------
+        np.ndarray
+            The document IDs of the posting list.
+        np.ndarray
+            The tf of the term in each of those documents.
+        """
+        postings = self.postings.get(term, None)
+        if postings is None:
+            posting = self.index[term]
+            postings = (np.array(list(posting.keys())), np.fromiter(posting.values(), dtype=np.float64, count=len(posting)))
+            self.postings[term] = postings
+        return postings
+
+    def get_posting_lengths(self, term, document_lengths):
+        """
+        Returns the lengths of the documents in the posting list of a term, aligned with the
+        arrays of get_postings_arrays.
+
+        Parameters
+        ----------
+        term : str
+            The term to get the document lengths for.
+        document_lengths : dict
+            A dictionary of the document lengths. The keys are the document IDs, and the values are
+            the document's length in that field.
+
+        Returns
+        -------
+        np.ndarray
+            The length of each document of the posting list.
+        """
+        lengths = self.posting_lengths.get(term, None)
+        if lengths is None:
+            ids, _ = self.get_postings_arrays(term)
+            lengths = np.fromiter((document_lengths[doc] for doc in ids.tolist()), dtype=np.float64, count=len(ids))
+            self.posting_lengths[term] = lengths
+        return lengths
+
+    def get_bm25_scale(self, k1=1.2):
+        """
+        Returns the global factor that maps BM25 term scores of this index onto int16.
+
+        Parameters
+        ----------
+        k1 : float, optional
+            The tf saturation parameter. Defaults to 1.2.
+
+        Returns
+        -------
+        float
+            The number of int16 units per unit of BM25 score.
+        """
+        # a term scores at most idf * (k1 + 1), and the idf is largest, log(N), for a term of a single document
+        return np.iinfo(np.int16).max / (max(math.log(self.N), 1.0) * (k1 + 1))
+
+    def get_quantized_bm25_scores(self, term, average_document_field_length, document_lengths, k1=1.2, b=0.75):
+        """
+        Returns the BM25 scores of the posting list of a term quantized to int16, aligned with the
+        arrays of get_postings_arrays.
+
+        Parameters
+        ----------
+        term : str
+            The term to get the scores for.
+        average_document_field_length : float
+            The average length of the documents in the index.
+        document_lengths : dict
+            A dictionary of the document lengths. The keys are the document IDs, and the values are
+            the document's length in that field.
+        k1 : float, optional
+            The tf saturation parameter. Defaults to 1.2.
+        b : float, optional
+            The document length normalization parameter. Defaults to 0.75.
+
+        Returns
+        -------
+        np.ndarray
+            The int16 score of each document of the posting list, in units of 1 / get_bm25_scale(k1).
+        """
+        key = (term, k1, b)
+        quantized = self.quantized.get(key, None)
+        if quantized is None:
+            _, tfs = self.get_postings_arrays(term)
+            norms = 1 - b + (b / average_document_field_length) * self.get_posting_lengths(term, document_lengths)
+            scores = self.get_idf(term) * tfs * (k1 + 1) / (tfs + k1 * norms)
+            quantized = np.rint(scores * self.get_bm25_scale(k1)).astype(np.int16)
+            self.quantized[key] = quantized
+        return quantized
+
+    def get_max_term_score(self, term, method, average_document_field_length=None, document_lengths=None,
+                           k1=1.2, b=0.75, quantized=False):
+        """
+        Returns the highest score a document of the index gets from a term, i.e. its BM25 score or,
+        for the vector space model, its weight in the document vector.
+
+        Parameters
+        ----------
+        term : str
+            The term to get the highest score of.
+        method : str ((n|l)(n|t)(n|c).(n|l)(n|t)(n|c)) | OkapiBM25
+            The method the documents are scored with.
+        average_document_field_length : float, optional
+            The average length of the documents in the index. Only used by BM25.
+        document_lengths : dict, optional
+            A dictionary of the document lengths. Only used by BM25.
+        k1 : float, optional
+            The tf saturation parameter of BM25. Defaults to 1.2.
+        b : float, optional
+            The document length normalization parameter of BM25. Defaults to 0.75.
+        quantized : bool, optional
+            If True, the highest of the quantized BM25 scores is returned. Defaults to False.
+
+        Returns
+        -------
+        float
+            The highest score of the term, 0 if no document of the index contains it.
+        """
+        if term not in self.index:
+            return 0.0
+        doc_method = "okapiBM25" if method == "okapiBM25" else method.split('.')[0]
+        key = (term, doc_method, k1, b, quantized)
+        max_score = self.max_scores.get(key, None)
+        if max_score is None:
+            _, tfs = self.get_postings_arrays(term)
+            if doc_method == "okapiBM25" and quantized:
+                scores = self.get_quantized_bm25_scores(term, average_document_field_length, document_lengths, k1, b)
+                max_score = int(scores.max()) / self.get_bm25_scale(k1)
+            elif doc_method == "okapiBM25":
+                norms = 1 - b + (b / average_document_field_length) * self.get_posting_lengths(term, document_lengths)
+                max_score = float((self.get_idf(term) * tfs * (k1 + 1) / (tfs + k1 * norms)).max())
+            elif doc_method[2] == 'c':
+                # a cosine normalized vector has no component above 1
+                max_score = 1.0
+            else:
+                # the n, l and t weights grow with the tf, so the largest tf has the largest weight
+                max_score = float(self.get_smart_weights(np.array([[tfs.max()]]), doc_method,
+                                                         np.array([self.get_idf(term)]))[0, 0])
+            self.max_scores[key] = max_score
+        return max_score
+
+    def get_max_query_term_scores(self, query, method, average_document_field_length=None, document_lengths=None,
+                                  k1=1.2, b=0.75, quantized=False):
+        """
+        Returns the most each term of a query adds to the score of a document of the index.
+
+        Parameters
+        ----------
+        query: List[str]
+            The query to be scored
+        method : str ((n|l)(n|t)(n|c).(n|l)(n|t)(n|c)) | OkapiBM25
+            The method the documents are scored with.
+        average_document_field_length : float, optional
+            The average length of the documents in the index. Only used by BM25.
+        document_lengths : dict, optional
+            A dictionary of the document lengths. Only used by BM25.
+        k1 : float, optional
+            The tf saturation parameter of BM25. Defaults to 1.2.
+        b : float, optional
+            The document length normalization parameter of BM25. Defaults to 0.75.
+        quantized : bool, optional
+            If True, the scores are bounded by the quantized BM25 scores. Defaults to False.
+
+        Returns
+        -------
+        dict
+            A dictionary of the query terms and the most they add to a document's score.
+        """
+        query_tf = self.get_query_tfs(query)
+        if method == "okapiBM25":
+            # compute_socres_with_okapi_bm25 scores a repeated query term once per occurrence
+            return {term: tf * self.get_max_term_score(term, method, average_document_field_length, document_lengths,
+                                                       k1, b, quantized)
+                    for term, tf in query_tf.items()}
+
+        # the query vector is weighted like in compute_scores_with_vector_space_model
+        terms = list(query_tf)
+        query_vector = self.get_smart_weights(np.array([[query_tf[term] for term in terms]], dtype=np.float64),
+                                              method.split('.')[1], np.array([self.get_idf(term) for term in terms]))[0]
+        return {term: self.get_max_term_score(term, method) * weight for term, weight in zip(terms, query_vector.tolist())}
+
     def get_query_tfs(self, query):
         """
         Returns the term frequencies of the terms in the query.
@@ -116,50 +544,168 @@ class Scorer:
         method = method.split('.')
         doc_method = method[0]
         query_method = method[1]
-        docs = self.get_list_of_documents(query)
-        idfs = {term:self.get_idf(term) for term in query}
+        # repeated query terms only raise their query tf, each term is one dimension of the vectors
+        terms = list(dict.fromkeys(query))
+        docs, tfs = self.get_candidate_tf_matrix(terms)
+        if not docs:
+            return {}
+        idfs = np.array([self.get_idf(term) for term in terms])
         query_tf = self.get_query_tfs(query)
-        query_scores = []
-        for term in query:
-            term_tf = query_tf[term]
-            if query_method[0] == 'l':
-                term_tf = 1 + math.log(term_tf)
-            term_idf = 1
-            if query_method[1] == 't':
-                term_idf = idfs[term]
-            query_scores.append(term_idf*term_tf)
-        query_scores = np.array(query_scores)
-        if query_method[2] == 'c':
-            weight = np.dot(query_scores,query_scores)
-            query_scores = weight * query_scores
-        query_score = {}
-        for i,term in enumerate(query):
-            query_score.update({term:query_scores[i]})
-
-
-        scores = {}
-        for doc in docs:
-            doc_scores = []
-            for term in query:
-                doc_tf = self.index[term][doc]
-                if doc_method[0] == 'l':
-                    doc_tf = 1 + math.log(doc_tf)
-                doc_idf = 1
-                if doc_method[1] == 't':
-                    doc_idf = idfs[term]
-                doc_scores.append(doc_tf*doc_idf)
-            doc_scores = np.array(doc_scores)
-            if doc_method[2] == 'c':
-                weight = np.dot(doc_scores,doc_scores)
-                doc_scores = weight * doc_scores
-            score = 0
-            for i,term in enumerate(query):
-                score += query_score[term] * doc_scores[i]
-            scores.update({doc:score})
+        query_vector = self.get_smart_weights(np.array([[query_tf[term] for term in terms]], dtype=np.float64),
+                                              query_method, idfs)[0]
+        doc_vectors = self.get_smart_weights(tfs, doc_method, idfs)
+        scores = doc_vectors @ query_vector
+        return dict(zip(docs, scores.tolist()))
+
+    def get_candidate_tf_matrix(self, terms):
+        """
+        Returns the documents that contain at least one of the terms, with the tfs of the terms in them.
+
+        Parameters
+        ----------
+        terms : List[str]
+            The terms, one column each.
+
+        Returns
+        -------
+        list
+            The documents, one row each.
+        np.ndarray
+            A (len(documents), len(terms)) matrix of the tf of each term in each document.
+        """
+        if self.postings_matrix is not None:
+            return self.postings_matrix.get_tf_matrix(terms)
+        docs = self.get_list_of_documents(terms)
+        return docs, self.get_tf_matrix(terms, docs)
+
+    def get_tf_matrix(self, terms, docs):
+        """
+        Returns the tfs of the terms in the documents as a matrix.
+
+        Parameters
+        ----------
+        terms : List[str]
+            The terms, one column each.
+        docs : List[str]
+            The documents, one row each.
+
+        Returns
+        -------
+        np.ndarray
+            A (len(docs), len(terms)) matrix of the tf of each term in each document, 0 where the
+            document does not contain the term.
+        """
+        doc_positions = {doc: i for i, doc in enumerate(docs)}
+        tfs = np.zeros((len(docs), len(terms)))
+        for j, term in enumerate(terms):
+            posting = self.index.get(term, {})
+            rows = np.fromiter((doc_positions[doc] for doc in posting), dtype=np.intp, count=len(posting))
+            tfs[rows, j] = np.fromiter(posting.values(), dtype=np.float64, count=len(posting))
+        return tfs
+
+    def get_smart_weights(self, tfs, method, idfs):
+        """
+        Weights the rows of a tf matrix with the SMART notation of a vector space model.
+
+        Parameters
+        ----------
+        tfs : np.ndarray
+            The tf matrix, one row per vector and one column per term.
+        method : str (n|l)(n|t)(n|c)
+            The tf, idf and normalization letters of the method.
+        idfs : np.ndarray
+            The idf of each term.
+
+        Returns
+        -------
+        np.ndarray
+            The weighted vectors.
+        """
+        return _compile_smart_weights(method)(tfs, idfs)
+
+    def compute_scores_batched(self, queries, method):
+        """
+        compute the vector space model scores of many queries at once, with one sparse product of
+        their query vectors and the weighted postings matrix
+
+        Parameters
+        ----------
+        queries: List[List[str]]
+            The queries to be scored
+        method : str ((n|l)(n|t)(n|c).(n|l)(n|t)(n|c))
+            The method to use for searching.
+
+        Returns
+        -------
+        np.ndarray
+            A (len(queries), number of documents) matrix of the scores, its columns aligned with the
+            doc_ids of the postings matrix. Each score equals compute_scores_with_vector_space_model's.
+        """
+
+        doc_method, query_method = method.split('.')
+        term_rows = self.postings_matrix.term_rows
+        terms = list(dict.fromkeys(term for query in queries for term in query if term in term_rows))
+        term_columns = {term: j for j, term in enumerate(terms)}
+        idfs = np.array([self.get_idf(term) for term in terms])
 
+        # each query is weighted over all its terms, so terms missing from the index still count in its norm
+        query_rows, query_columns, query_weights = [], [], []
+        for i, query in enumerate(queries):
+            query_terms = list(dict.fromkeys(query))
+            query_tf = self.get_query_tfs(query)
+            weights = self.get_smart_weights(np.array([[query_tf[term] for term in query_terms]], dtype=np.float64),
+                                             query_method, np.array([self.get_idf(term) for term in query_terms]))[0]
+            for term, weight in zip(query_terms, weights.tolist()):
+                if term in term_columns:
+                    query_rows.append(i)
+                    query_columns.append(term_columns[term])
+                    query_weights.append(weight)
+        query_vectors = sp.csr_matrix((query_weights, (query_rows, query_columns)), shape=(len(queries), len(terms)))
 
+        doc_vectors = self.postings_matrix.matrix[[term_rows[term] for term in terms]]
+        if doc_method[0] == 'l':
+            doc_vectors.data = 1 + np.log(doc_vectors.data)
+        if doc_method[1] == 't':
+            doc_vectors = sp.csr_matrix(doc_vectors.multiply(idfs[:, None]))
+        scores = (query_vectors @ doc_vectors).toarray()
+        if doc_method[2] == 'c':
+            # a document is normalized over the terms of each query, like in the single query model
+            query_terms = query_vectors.copy()
+            query_terms.data[:] = 1
+            norms = np.sqrt((query_terms @ doc_vectors.multiply(doc_vectors)).toarray())
+            scores = np.divide(scores, norms, out=np.zeros_like(scores), where=norms > 0)
         return scores
 
+    def get_top_documents_batched(self, scores, max_results):
+        """
+        Returns the best scored documents of each query of compute_scores_batched.
+
+        Parameters
+        ----------
+        scores : np.ndarray
+            The scores returned by compute_scores_batched.
+        max_results : int
+            The maximum number of documents to return per query.
+
+        Returns
+        -------
+        List[list]
+            For each query, a list of tuples of the document IDs and their positive scores sorted by their scores.
+        """
+
+        top = np.arange(scores.shape[1])[None, :].repeat(len(scores), axis=0)
+        if max_results < scores.shape[1]:
+            top = np.argpartition(-scores, max_results, axis=1)[:, :max_results]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        doc_ids = self.postings_matrix.doc_ids
+        return [
+            [(doc, score) for doc, score in zip(doc_ids[row].tolist(), row_scores.tolist()) if score > 0]
+            for row, row_scores in zip(top, top_scores)
+        ]
+
     def get_vector_space_model_score(self, query, query_tfs, document_id, document_method, query_method):
         """
         Returns the Vector Space Model score of a document for a query.
@@ -186,7 +732,8 @@ class Scorer:
         #TODO
         pass
 
-    def compute_socres_with_okapi_bm25(self, query, average_document_field_length, document_lengths):
+    def compute_socres_with_okapi_bm25(self, query, average_document_field_length, document_lengths, k1=1.2, b=0.75,
+                                       quantized=False):
         """
         compute scores with okapi bm25
 
@@ -199,6 +746,13 @@ class Scorer:
         document_lengths : dict
             A dictionary of the document lengths. The keys are the document IDs, and the values are
             the document's length in that field.
+        k1 : float, optional
+            The tf saturation parameter. Defaults to 1.2.
+        b : float, optional
+            The document length normalization parameter. Defaults to 0.75.
+        quantized : bool, optional
+            If True, the terms are scored with their int16 scores from get_quantized_bm25_scores and
+            summed in int32. Defaults to False.
         
         Returns
         -------
@@ -206,8 +760,86 @@ class Scorer:
             A dictionary of the document IDs and their scores.
         """
 
-        # TODO
-        pass
+        if self.postings_matrix is not None and not quantized:
+            # the postings of all the terms are scored in one pass over the CSR arrays
+            rows = np.array([self.postings_matrix.term_rows[term] for term in query if term in self.index],
+                            dtype=np.int64)
+            if not len(rows):
+                return {}
+            idfs = np.array([self.get_idf(term) for term in query if term in self.index])
+            matrix = self.postings_matrix.matrix
+            scores = np.zeros(matrix.shape[1])
+            _bm25_kernel(rows, idfs, matrix.indptr, matrix.indices, matrix.data,
+                         self.postings_matrix.get_document_lengths(document_lengths),
+                         average_document_field_length, k1, b, scores)
+            columns = np.unique(np.concatenate([matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]]
+                                                for row in rows.tolist()]))
+            return dict(zip(self.postings_matrix.doc_ids[columns].tolist(), scores[columns].tolist()))
+
+        # each term is scored over its whole posting list at once, then the per-term
+        # scores are summed per document with a single bincount
+        doc_ids = []
+        term_scores = []
+        for term in query:
+            if term not in self.index:
+                continue
+            ids, tfs = self.get_postings_arrays(term)
+            doc_ids.append(ids)
+            if quantized:
+                term_scores.append(self.get_quantized_bm25_scores(term, average_document_field_length,
+                                                                  document_lengths, k1, b))
+                continue
+            norms = 1 - b + (b / average_document_field_length) * self.get_posting_lengths(term, document_lengths)
+            term_scores.append(self.get_idf(term) * tfs * (k1 + 1) / (tfs + k1 * norms))
+
+        if not doc_ids:
+            return {}
+        doc_ids, positions = np.unique(np.concatenate(doc_ids), return_inverse=True)
+        if quantized:
+            accumulator = np.zeros(len(doc_ids), dtype=np.int32)
+            np.add.at(accumulator, positions, np.concatenate(term_scores).astype(np.int32))
+            scores = accumulator / self.get_bm25_scale(k1)
+        else:
+            scores = np.bincount(positions, weights=np.concatenate(term_scores), minlength=len(doc_ids))
+        return dict(zip(doc_ids.tolist(), scores.tolist()))
+
+    def compute_bm25_scores_batched(self, queries, average_document_field_length, document_lengths, k1=1.2, b=0.75):
+        """
+        compute the okapi bm25 scores of many queries at once, as one score matrix like
+        compute_scores_batched. The queries are scored one after another with the BM25 kernel.
+
+        Parameters
+        ----------
+        queries: List[List[str]]
+            The queries to be scored
+        average_document_field_length : float
+            The average length of the documents in the index.
+        document_lengths : dict
+            A dictionary of the document lengths. The keys are the document IDs, and the values are
+            the document's length in that field.
+        k1 : float, optional
+            The tf saturation parameter. Defaults to 1.2.
+        b : float, optional
+            The document length normalization parameter. Defaults to 0.75.
+
+        Returns
+        -------
+        np.ndarray
+            A (len(queries), number of documents) matrix of the scores, its columns aligned with the
+            doc_ids of the postings matrix.
+        """
+
+        matrix = self.postings_matrix.matrix
+        Ld = self.postings_matrix.get_document_lengths(document_lengths)
+        scores = np.zeros((len(queries), matrix.shape[1]))
+        for query, query_scores in zip(queries, scores):
+            terms = [term for term in query if term in self.postings_matrix.term_rows]
+            if terms:
+                rows = np.array([self.postings_matrix.term_rows[term] for term in terms], dtype=np.int64)
+                idfs = np.array([self.get_idf(term) for term in terms])
+                _bm25_kernel(rows, idfs, matrix.indptr, matrix.indices, matrix.data, Ld,
+                             average_document_field_length, k1, b, query_scores)
+        return scores
 
     def get_okapi_bm25_score(self, query, document_id, average_document_field_length, document_lengths):
         """
@@ -235,15 +867,15 @@ class Scorer:
         pass
 
     def compute_scores_with_unigram_model(
-            self, query, smoothing_method, document_lengths=None, alpha=0.5, lamda=0.5
+            self, query, smoothing_method, document_lengths=None, alpha=0.5, lamda=0.5, total_document_length=None
     ):
         """
         Calculates the scores for each document based on the unigram model.
 
         Parameters
         ----------
-        query : str
-            The query to search for.
+        query : List[str]
+            The terms of the query to search for.
         smoothing_method : str (bayes | naive | mixture)
             The method used for smoothing the probabilities in the unigram model.
         document_lengths : dict
@@ -254,6 +886,8 @@ class Scorer:
         lamda : float, optional
             The parameter used in some smoothing methods to balance between the document
             probability and the collection probability. Defaults to 0.5.
+        total_document_length : int, optional
+            The sum of the document lengths, if it is already known. Defaults to summing them.
 
         Returns
         -------
@@ -261,24 +895,126 @@ class Scorer:
             A dictionary of the document IDs and their scores.
         """
 
+        terms = list(dict.fromkeys(query))
+        documents, tfs = self.get_candidate_tf_matrix(terms)
+        if not documents:
+            return {}
+
+        # the probabilities of all the terms in all the candidate documents are computed as one matrix,
+        # and each document's score is the product of its row over the query's terms
+        T = total_document_length if total_document_length is not None else sum(document_lengths.values())
+        Ld = np.fromiter((document_lengths[doc] for doc in documents), dtype=np.float64, count=len(documents))
+        cfs = np.array([self.get_cf(term) for term in terms], dtype=np.float64)
+        probabilities = self.get_unigram_probabilities(tfs, Ld[:, None], cfs, T, smoothing_method, alpha, lamda)
+        term_columns = {term: j for j, term in enumerate(terms)}
+        scores = np.prod(probabilities[:, [term_columns[term] for term in query]], axis=1)
+        return dict(zip(documents, scores.tolist()))
+
+    def get_unigram_candidates(self, query, document_lengths):
+        """
+        Returns the documents scored by the unigram model for a query, with their lengths.
+
+        Parameters
+        ----------
+        query : List[str]
+            The terms of the query to search for.
+        document_lengths : dict
+            A dictionary of the document lengths. The keys are the document IDs, and the values are
+            the document's length in that field.
+
+        Returns
+        -------
+        list
+            The documents that contain at least one of the terms in the query.
+        np.ndarray
+            The length of each of those documents.
+        """
         documents = self.get_list_of_documents(query)
-        scores = {}
-        for doc in documents:
-            doc_score = self.compute_score_with_unigram_model(query,doc,smoothing_method,document_lengths,alpha,lamda)
-            scores.update({doc:doc_score})
-        return scores
+        Ld = np.fromiter((document_lengths[doc] for doc in documents), dtype=np.float64, count=len(documents))
+        return documents, Ld
+
+    def score_term_unigram(self, term, documents, Ld, T, smoothing_method, alpha=0.5, lamda=0.5):
+        """
+        Returns the smoothed probability of a term in each of the candidate documents. The unigram
+        score of a document is the product of these over the query terms.
+
+        Parameters
+        ----------
+        term : str
+            The term to score.
+        documents : list
+            The candidate documents, as returned by get_unigram_candidates.
+        Ld : np.ndarray
+            The length of each candidate document.
+        T : int
+            The total length of the documents in the index.
+        smoothing_method : str (bayes | naive | mixture)
+            The method used for smoothing the probabilities in the unigram model.
+        alpha : float, optional
+            The parameter used in bayesian smoothing method. Defaults to 0.5.
+        lamda : float, optional
+            The parameter used in some smoothing methods to balance between the document
+            probability and the collection probability. Defaults to 0.5.
+
+        Returns
+        -------
+        np.ndarray
+            The probability of the term in each candidate document.
+        """
+        posting = self.index.get(term, {})
+        doc_tf = np.fromiter((posting.get(doc, 0) for doc in documents), dtype=np.float64, count=len(documents))
+        return self.get_unigram_probabilities(doc_tf, Ld, self.get_cf(term), T, smoothing_method, alpha, lamda)
+
+    def get_unigram_probabilities(self, tfs, Ld, cfs, T, smoothing_method, alpha=0.5, lamda=0.5):
+        """
+        Returns the smoothed probabilities of terms in documents. The arguments are broadcast
+        against each other, so it scores one term over the candidates or a whole tf matrix alike.
+
+        Parameters
+        ----------
+        tfs : np.ndarray
+            The tfs of the terms in the documents.
+        Ld : np.ndarray
+            The lengths of the documents.
+        cfs : np.ndarray
+            The collection frequencies of the terms.
+        T : int
+            The total length of the documents in the index.
+        smoothing_method : str (bayes | naive | mixture)
+            The method used for smoothing the probabilities in the unigram model.
+        alpha : float, optional
+            The parameter used in bayesian smoothing method. Defaults to 0.5.
+        lamda : float, optional
+            The parameter used in some smoothing methods to balance between the document
+            probability and the collection probability. Defaults to 0.5.
+
+        Returns
+        -------
+        np.ndarray
+            The probabilities, shaped like tfs.
+        """
+        if smoothing_method == "bayes":
+            return (tfs + (alpha * cfs / T)) / (Ld + alpha)
+        # an empty document gives its terms no probability of its own, leaving mixture the background one
+        tfs, Ld = np.broadcast_arrays(np.asarray(tfs, dtype=np.float64), np.asarray(Ld, dtype=np.float64))
+        document_probabilities = np.divide(tfs, Ld, out=np.zeros(tfs.shape), where=Ld > 0)
+        if smoothing_method == "mixture":
+            return lamda * document_probabilities + (1 - lamda) * (cfs / T)
+        if smoothing_method == "naive":
+            return document_probabilities
+        return np.zeros_like(tfs)
 
 
     def compute_score_with_unigram_model(
-            self, query, document_id, smoothing_method, document_lengths, alpha, lamda
+            self, query, document_id, smoothing_method, document_lengths, alpha, lamda, total_document_length=None
     ):
         """
         Calculates the scores for each document based on the unigram model.
 
         Parameters
         ----------
-        query : str
-            The query to search for.
+        query : List[str]
+            The terms of the query to search for.
         document_id : str
             The document to calculate the score for.
         smoothing_method : str (bayes | naive | mixture)
@@ -291,6 +1027,8 @@ class Scorer:
         lamda : float, optional
             The parameter used in some smoothing methods to balance between the document
             probability and the collection probability. Defaults to 0.5.
+        total_document_length : int, optional
+            The sum of the document lengths, if it is already known. Defaults to summing them.
 
         Returns
         -------
@@ -299,24 +1037,18 @@ class Scorer:
         """
 
 
-        terms = query.split()
         score = 1
-        T = np.sum(np.array(list(document_lengths.values())))
-        for term in terms:
-            if document_id in self.index[term]:
-                doc_tf = self.index[term][document_id]
-            else:
-                doc_tf = 0
-            term_cf = 0
-            for doc in self.index[term].keys() :
-                term_cf += self.index[term][doc]
-            Ld = document_lengths[document_id]
+        T = total_document_length if total_document_length is not None else sum(document_lengths.values())
+        Ld = document_lengths[document_id]
+        for term in query:
+            doc_tf = self.index.get(term, {}).get(document_id, 0)
+            term_cf = self.get_cf(term)
             term_score = 0
             if smoothing_method == "bayes":
                 term_score = (doc_tf+(alpha*term_cf/T))/(Ld + alpha)
             elif smoothing_method == "mixture":
-                term_score = lamda*(doc_tf/Ld) + (1-lamda)*(term_cf/T)
+                term_score = lamda*(doc_tf/Ld if Ld else 0) + (1-lamda)*(term_cf/T)
             elif smoothing_method == "naive":
-                term_score = doc_tf/Ld
+                term_score = doc_tf/Ld if Ld else 0
             score *= term_score
         return score
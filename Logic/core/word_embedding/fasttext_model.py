@@ -1,4 +1,8 @@
+import os
 import string
+from functools import lru_cache
+from multiprocessing import Pool
+from pathlib import Path
 
 import fasttext
 import re
@@ -6,11 +10,29 @@ import re
 from tqdm import tqdm
 from nltk.corpus import stopwords
 from nltk.tokenize import word_tokenize
-from scipy.spatial import distance
 import numpy as np
 
 from .fasttext_data_loader import FastTextDataLoader
 
+_PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation)
+# the training corpus is staged in memory where the system has a tmpfs, since fasttext only reads it once
+TRAIN_DATA_DIR = Path(os.getenv("MIR_TRAIN_DATA_DIR", "/dev/shm" if os.path.isdir("/dev/shm") else "."))
+
+
+@lru_cache(maxsize=8)
+def _get_stop_words(stopwords_domain=()):
+    """
+    Returns the stopwords to remove, loaded once per domain.
+
+    Parameters
+    ----------
+    stopwords_domain: tuple
+        stopwords of a domain, or an empty tuple for nltk's english stopwords
+    """
+    if not stopwords_domain:
+        return frozenset(stopwords.words('english'))
+    return frozenset(stopwords_domain)
+
 
 def preprocess_text(text, minimum_length=1, stopword_removal=True, stopwords_domain=[], lower_case=True,
                        punctuation_removal=True):
@@ -37,17 +59,15 @@ def preprocess_text(text, minimum_length=1, stopword_removal=True, stopwords_dom
     if lower_case:
         text = text.lower()
 
+    # removing the punctuation from the whole text leaves the same tokens, except the ones made only of
+    # punctuation, which are dropped here instead of becoming empty tokens
+    if punctuation_removal:
+        text = text.translate(_PUNCTUATION_TABLE)
 
     tokens = text.split()
 
-    if punctuation_removal:
-        tokens = [token.translate(str.maketrans('', '', string.punctuation)) for token in tokens]
-
     if stopword_removal:
-        if not stopwords_domain:
-            stop_words = set(stopwords.words('english'))
-        else:
-            stop_words = set(stopwords_domain)
+        stop_words = _get_stop_words(tuple(stopwords_domain))
         tokens = [token for token in tokens if token not in stop_words]
 
     tokens = [token for token in tokens if len(token) >= minimum_length]
@@ -67,9 +87,23 @@ class FastText:
         The training method for the FastText model.
     model : fasttext.FastText._FastText
         The trained FastText model.
+    words : list of str
+        The vocabulary of the model.
+    word2row : dict
+        The row of each vocabulary word in W.
+    W : np.ndarray
+        The word vectors of the vocabulary, one row per word.
+    Wn : np.ndarray
+        The rows of W normalized to unit length. None if the vectors are quantized.
+    Wq : np.ndarray
+        The rows of Wn quantized to int8, if quantize_vectors is set.
+    scales : np.ndarray
+        The scale of each row of Wq.
+    index_nn : faiss.IndexHNSWFlat
+        An HNSW graph of the normalized word vectors, if use_hnsw is set.
     """
 
-    def __init__(self, method='skipgram'):
+    def __init__(self, method='skipgram', quantize_vectors=False, use_hnsw=False):
         """
         Initializes the FastText with a preprocessor and a training method.
 
@@ -77,12 +111,93 @@ class FastText:
         ----------
         method : str, optional
             The training method for the FastText model.
+        quantize_vectors : bool, optional
+            If True, the normalized word vectors are kept as int8 with a scale per row, a quarter of
+            their float32 memory, and similarities are computed on them. Defaults to False.
+        use_hnsw : bool, optional
+            If True, nearest words are searched approximately in an HNSW graph built with faiss when the
+            vectors are loaded, instead of being compared with the whole vocabulary. Defaults to False.
         """
         self.method = method
+        self.quantize_vectors = quantize_vectors
+        self.use_hnsw = use_hnsw
         self.model = None
+        self.words = []
+        self.word2row = {}
+        self.W = None
+        self.Wn = None
+        self.Wq = None
+        self.scales = None
+        self.index_nn = None
+
+    def build_word_vectors(self):
+        """
+        Looks the vectors of the whole vocabulary up once, so queries and analogies read them from a matrix
+        instead of asking the model word by word.
+        """
+        self.words = self.model.get_words()
+        self.word2row = {word: row for row, word in enumerate(self.words)}
+        # the input matrix also holds the subword buckets, and a word's vector averages its subwords in,
+        # so the vectors are taken from the model rather than from its rows
+        self.W = np.array([self.model.get_word_vector(word) for word in self.words], dtype=np.float32)
+        norms = np.linalg.norm(self.W, axis=1, keepdims=True)
+        self.Wn = np.divide(self.W, norms, out=np.zeros_like(self.W), where=norms > 0)
+        if self.use_hnsw:
+            import faiss
+
+            self.index_nn = faiss.IndexHNSWFlat(self.Wn.shape[1], 32, faiss.METRIC_INNER_PRODUCT)
+            self.index_nn.add(self.Wn)
+        if self.quantize_vectors:
+            self.Wq, self.scales = self.quantize(self.Wn)
+            self.Wn = None
+
+    @staticmethod
+    def quantize(vectors):
+        """
+        Quantizes the rows of a matrix to int8 with a scale per row.
+
+        Parameters
+        ----------
+        vectors : np.ndarray
+            The vectors to quantize, one per row.
+
+        Returns
+        -------
+        np.ndarray
+            The int8 vectors.
+        np.ndarray
+            The scale of each vector, so a vector is approximately its int8 row times its scale.
+        """
+        vectors = np.atleast_2d(vectors)
+        scales = np.abs(vectors).max(axis=1) / 127
+        quantized = np.divide(vectors, scales[:, np.newaxis], out=np.zeros_like(vectors), where=scales[:, np.newaxis] > 0)
+        return np.round(quantized).astype(np.int8), scales.astype(np.float32)
+
+    def get_similarities(self, vector):
+        """
+        Returns the cosine similarity of a vector with every word of the vocabulary.
+
+        Parameters
+        ----------
+        vector : np.ndarray
+            The vector to compare the words with.
+
+        Returns
+        -------
+        np.ndarray
+            The similarity of each word, aligned with words.
+        """
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+        if self.Wq is None:
+            return self.Wn @ vector.astype(np.float32)
+        quantized, scale = self.quantize(vector)
+        # the int8 products are accumulated in int32, then the row and query scales are applied
+        return np.matmul(self.Wq, quantized[0], dtype=np.int32) * (self.scales * scale[0])
 
 
-    def train(self, texts):
+    def train(self, texts, do_preprocess=False, num_workers=1):
         """
         Trains the FastText model with the given texts.
 
@@ -90,12 +205,27 @@ class FastText:
         ----------
         texts : list of str
             The texts to train the FastText model.
+        do_preprocess : bool, optional
+            Whether to preprocess the texts with preprocess_text before training.
+        num_workers : int, optional
+            The number of processes to preprocess the texts with, while this process writes them. If None,
+            the MIR_NUM_WORKERS environment variable is used, or one process per CPU.
         """
-        with open("train_data.txt", "w") as f:
-            for text in texts:
-                f.write(text + "\n")
-
-        self.model = fasttext.train_unsupervised("train_data.txt", model=self.method)
+        if num_workers is None:
+            num_workers = int(os.getenv("MIR_NUM_WORKERS", os.cpu_count() or 1))
+        train_data = TRAIN_DATA_DIR / f"train_data_{os.getpid()}.txt"
+        try:
+            with open(train_data, "w", buffering=1 << 20) as f:
+                if do_preprocess and num_workers > 1:
+                    with Pool(num_workers) as pool:
+                        f.writelines(text + "\n" for text in pool.imap(preprocess_text, texts, chunksize=1024))
+                else:
+                    f.writelines((preprocess_text(text) if do_preprocess else text) + "\n" for text in texts)
+
+            self.model = fasttext.train_unsupervised(str(train_data), model=self.method)
+        finally:
+            train_data.unlink(missing_ok=True)
+        self.build_word_vectors()
 
     def get_query_embedding(self, query, tf_idf_vectorizer, do_preprocess):
         """
@@ -119,25 +249,62 @@ class FastText:
             query = preprocess_text(query)
 
         words = query.split()
-        tfidf_weights = tf_idf_vectorizer.transform([query]).toarray()[0]
+        # only the few nonzero columns of the query's tf-idf row are read, the row is never densified
+        tfidf = tf_idf_vectorizer.transform([query])
+        tfidf_weights = dict(zip(tfidf.indices.tolist(), tfidf.data.tolist()))
+        vocabulary = tf_idf_vectorizer.vocabulary_
 
-        word_vectors = []
+        rows = []
         weights = []
         for word in words:
-            if word in self.model.words:
-                word_vectors.append(self.model.get_word_vector(word))
-                word_index = tf_idf_vectorizer.vocabulary_.get(word)
-                if word_index is not None:
-                    weights.append(tfidf_weights[word_index])
-
-        if not word_vectors:
+            if word in self.word2row:
+                rows.append(self.word2row[word])
+                # a word the vectorizer does not know weighs 0, so the weights stay aligned with the rows
+                weights.append(tfidf_weights.get(vocabulary.get(word), 0.0))
+
+        weights = np.array(weights, dtype=np.float32)
+        total_weight = weights.sum()
+        if not rows or total_weight == 0:
             return None
 
-        weighted_word_vectors = np.array(word_vectors) * np.array(weights)[:, np.newaxis]
-        query_embedding = np.sum(weighted_word_vectors, axis=0) / np.sum(weights)
+        query_embedding = np.einsum('i,ij->j', weights, self.W[rows]) / total_weight
 
         return query_embedding
 
+    def get_nearest_words(self, vector, k=1, exclude=()):
+        """
+        Returns the words whose vectors are the most cosine similar to a vector.
+
+        Parameters
+        ----------
+        vector : np.ndarray
+            The vector to find the nearest words of.
+        k : int, optional
+            The number of words to return. Defaults to 1.
+        exclude : iterable of str, optional
+            Words that are never returned.
+
+        Returns
+        -------
+        list of str
+            The nearest words, the most similar first.
+        """
+        exclude = {self.word2row[word] for word in exclude if word in self.word2row}
+        if self.index_nn is not None:
+            norm = np.linalg.norm(vector)
+            query = (vector / norm if norm > 0 else vector).astype(np.float32)[np.newaxis]
+            _, rows = self.index_nn.search(query, k + len(exclude))
+            return [self.words[row] for row in rows[0].tolist() if row >= 0 and row not in exclude][:k]
+
+        similarities = self.get_similarities(vector)
+        similarities[list(exclude)] = -np.inf
+        k = min(k, len(similarities) - len(exclude))
+        if k <= 0:
+            return []
+        rows = np.argpartition(-similarities, k - 1)[:k]
+        rows = rows[np.argsort(-similarities[rows], kind='stable')]
+        return [self.words[row] for row in rows.tolist()]
+
     def analogy(self, word1, word2, word3):
         """
         Perform an analogy task: word1 is to word2 as word3 is to __.
@@ -158,23 +325,12 @@ class FastText:
         # Perform vector arithmetic
         result_vector = vec1 - vec2 + vec3
 
-        # Create a dictionary mapping each word in the vocabulary to its corresponding vector
-        words_to_vectors = {}
-        for word in self.model.words :
-            words_to_vectors.update({word:self.model.get_word_vector(word)})
-
-        # Exclude the input words from the possible results
-        words_to_exclude = {word1, word2, word3}
-
-        # Find the word whose vector is closest to the result vector
-        nearest_word = None
-        min_distance = float("inf")
-        for word,vector in enumerate(words_to_vectors):
-            vector_distance = distance.euclidean(result_vector,vector)
-            if vector_distance < min_distance:
-                nearest_word = word
+        # Find the word whose vector is the most cosine similar to the result vector, excluding the input words
+        nearest_words = self.get_nearest_words(result_vector, 1, (word1, word2, word3))
+        if not nearest_words:
+            return None
 
-        return nearest_word
+        return nearest_words[0]
 
     def save_model(self, path='FastText_model.bin'):
         """
@@ -197,6 +353,7 @@ class FastText:
             The path to load the FastText model.
         """
         self.model = fasttext.load_model(path)
+        self.build_word_vectors()
 
 
     def prepare(self, dataset, mode, save=False, path='FastText_model.bin'):
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the core modules import each other as top level packages (utility, indexer, ...)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "core"))
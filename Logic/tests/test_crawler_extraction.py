@@ -0,0 +1,74 @@
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from selectolax.lexbor import LexborHTMLParser
+
+from utility.crawler import IMDbCrawler
+
+pages = Path(__file__).resolve().parent / "pages"
+
+
+@pytest.fixture(scope="module")
+def title_page():
+    return (pages / "tt0111161.html").read_bytes()
+
+
+@pytest.fixture
+def crawler():
+    crawler = IMDbCrawler()
+    yield crawler
+    crawler.fetcher.shutdown()
+
+
+def test_page_data_regex_matches_the_parsed_script(title_page):
+    page_data = IMDbCrawler.get_page_data_from_content(title_page)
+    assert page_data is not None
+    assert page_data == IMDbCrawler.get_page_data(LexborHTMLParser(title_page))
+
+
+def test_fields_from_page_data(title_page):
+    page_data = IMDbCrawler.get_page_data(LexborHTMLParser(title_page))
+    assert IMDbCrawler.get_first_page_summary(page_data).startswith("Over the course of several years")
+    assert IMDbCrawler.get_rating(page_data) == 9.3
+    assert IMDbCrawler.get_mpaa(page_data) == "R"
+    assert IMDbCrawler.get_release_year(page_data) == 1994
+    assert IMDbCrawler.get_genres(page_data) == ["Drama"]
+    assert IMDbCrawler.get_languages(page_data) == ["English"]
+    assert IMDbCrawler.get_countries_of_origin(page_data) == ["United States"]
+    assert IMDbCrawler.get_budget(page_data) == 25000000
+    assert IMDbCrawler.get_gross_worldwide(page_data) == 28904232
+    assert IMDbCrawler.get_director(page_data) == ["Frank Darabont"]
+    assert IMDbCrawler.get_writers(page_data) == ["Stephen King", "Frank Darabont"]
+    assert IMDbCrawler.get_stars(page_data) == ["Tim Robbins", "Morgan Freeman", "Bob Gunton"]
+
+
+def test_missing_fields_are_none():
+    assert IMDbCrawler.get_budget({"mainColumnData": {"productionBudget": None}}) is None
+    assert IMDbCrawler.get_genres({}) is None
+
+
+def test_fields_from_tree(crawler, title_page):
+    tree = LexborHTMLParser(title_page)
+    assert IMDbCrawler.get_title(tree) == "The Shawshank Redemption"
+    assert crawler.get_next_links(tree, "tt0111161") == [
+        "https://www.imdb.com/title/tt0068646",
+        "https://www.imdb.com/title/tt0468569",
+    ]
+
+
+def test_reviews_from_review_pages(crawler, title_page):
+    review_page = (pages / "rw2284594.html").read_bytes()
+    crawler.crawl = lambda url: SimpleNamespace(content=review_page)
+    assert crawler.get_reviews_with_scores(LexborHTMLParser(title_page)) == [
+        ["Why do I want to write the 234th comment on The Shawshank Redemption?", "10"]
+    ]
+
+
+def test_review_page_without_review_data_is_skipped(crawler):
+    review_page = (pages / "rw2284594.html").read_bytes()
+    tree = LexborHTMLParser(b'<a href="/review/rw1/">a</a><a href="/review/rw2/">b</a>')
+    crawler.crawl = lambda url: SimpleNamespace(content=review_page if url.endswith("rw1") else b"<html></html>")
+    assert crawler.get_reviews_with_scores(tree) == [
+        ["Why do I want to write the 234th comment on The Shawshank Redemption?", "10"]
+    ]
@@ -0,0 +1,73 @@
+import zlib
+
+import numpy as np
+
+from indexer.LSH import MinHashLSH
+
+documents = [
+    "the quick brown fox jumps over the lazy dog",
+    "the quick brown fox jumps over the lazy cat",
+    "a completely different sentence about movies and actors",
+    "",
+    "the quick brown fox jumps over the lazy dog",
+]
+prime = 4294967291
+
+
+def reference_signature(documents, num_hashes, seed):
+    # min-hashes of the rolling shingle hashes, one hash function and one document at a time
+    a, b = np.random.default_rng(seed).integers(1, prime, size=(num_hashes, 2), dtype=np.uint64).T.tolist()
+    signature = []
+    for i in range(num_hashes):
+        row = []
+        for document in documents:
+            words = [zlib.crc32(word.encode()) for word in document.split()]
+            shingles = set()
+            for start in range(len(words) - 1):
+                shingles.add(((words[start] * 1099511628211 + words[start + 1]) % 2 ** 64) % prime)
+            row.append(min(((a[i] + b[i] * x) % prime for x in shingles), default=2 ** 32 - 1))
+        signature.append(row)
+    return np.array(signature, dtype=np.uint32)
+
+
+def reference_band_key(signature, band, rows_per_band, document):
+    key = 14695981039346656037 ^ band
+    for row in signature[band * rows_per_band:(band + 1) * rows_per_band, document].tolist():
+        key = ((key ^ row) * 1099511628211) % 2 ** 64
+    return key
+
+
+def test_bit_vector_jaccard_scores_match_the_set_scores():
+    lsh = MinHashLSH(documents, 20, seed=7)
+    shingled_documents = [lsh.shingle_document(document) for document in documents]
+    bit_vectors = lsh.build_bit_vectors(shingled_documents)
+    for i, first_set in enumerate(shingled_documents):
+        for j, second_set in enumerate(shingled_documents):
+            expected = lsh.jaccard_score(first_set, second_set) if first_set | second_set else 0.0
+            assert lsh.jaccard_score_bits(bit_vectors[i], bit_vectors[j]) == expected
+
+
+def test_band_keys_are_deterministic_for_a_seed():
+    first = MinHashLSH(documents, 20, seed=7).perform_lsh(number_of_bands=4, number_of_rows=5)
+    second = MinHashLSH(documents, 20, seed=7).perform_lsh(number_of_bands=4, number_of_rows=5)
+    assert first == second
+
+    signature = MinHashLSH(documents, 20, seed=7).min_hash_signature()
+    for (band, key), docs in first.items():
+        for document in docs:
+            assert key == reference_band_key(signature, band, 5, document)
+
+    # identical documents share a bucket in every band
+    for band in range(4):
+        assert any({0, 4} <= set(docs_in_bucket) for (bucket_band, _), docs_in_bucket in first.items() if bucket_band == band)
+
+
+def test_min_hash_signature_matches_reference():
+    signature = MinHashLSH(documents, 20, seed=7).min_hash_signature()
+    assert signature.dtype == np.uint32
+    np.testing.assert_array_equal(signature, reference_signature(documents, 20, 7))
+
+
+def test_seeds_change_the_signature():
+    assert not np.array_equal(MinHashLSH(documents, 20, seed=7).min_hash_signature(),
+                              MinHashLSH(documents, 20, seed=8).min_hash_signature())
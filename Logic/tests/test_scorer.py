@@ -0,0 +1,169 @@
+import math
+
+import numpy as np
+import pytest
+
+from utility.scorer import PostingsMatrix, Scorer
+
+index = {
+    "drama": {"tt1": 2, "tt2": 1},
+    "comedy": {"tt2": 3, "tt3": 1},
+    "hanks": {"tt3": 2},
+}
+document_lengths = {"tt1": 4, "tt2": 5, "tt3": 3}
+
+
+@pytest.mark.parametrize("smoothing_method", ["bayes", "mixture", "naive"])
+def test_unigram_with_term_missing_from_index(smoothing_method):
+    # "tom" is in the query but not in this field's index, while the other terms are
+    query = ["tom", "hanks", "drama"]
+    scorer = Scorer(index, len(document_lengths))
+    T = sum(document_lengths.values())
+
+    scores = scorer.compute_scores_with_unigram_model(query, smoothing_method, document_lengths)
+    assert set(scores) == {"tt1", "tt2", "tt3"}
+    for document, score in scores.items():
+        assert score == pytest.approx(scorer.compute_score_with_unigram_model(
+            query, document, smoothing_method, document_lengths, 0.5, 0.5))
+
+    documents, Ld = scorer.get_unigram_candidates(query, document_lengths)
+    assert list(scorer.score_term_unigram("tom", documents, Ld, T, smoothing_method)) == [0.0] * len(documents)
+    assert scorer.get_cf("tom") == 0
+
+
+@pytest.mark.parametrize("method", ["tln.nnn", "cnl.lnc", "lnc.ntx", "ln.ltc", "lncc.ltc"])
+def test_vector_space_model_rejects_malformed_notation(method):
+    with pytest.raises(ValueError):
+        Scorer(index, len(document_lengths)).compute_scores_with_vector_space_model(["drama", "comedy"], method)
+
+
+@pytest.mark.parametrize("smoothing_method", ["bayes", "mixture", "naive"])
+def test_unigram_with_empty_document(smoothing_method):
+    lengths = dict(document_lengths, tt4=0)
+    scorer = Scorer(dict(index, drama=dict(index["drama"], tt4=0)), len(lengths))
+
+    with np.errstate(all="raise"):
+        scores = scorer.compute_scores_with_unigram_model(["drama"], smoothing_method, lengths)
+    assert all(np.isfinite(score) for score in scores.values())
+    assert scores["tt4"] == pytest.approx(scorer.compute_score_with_unigram_model(
+        ["drama"], "tt4", smoothing_method, lengths, 0.5, 0.5))
+    if smoothing_method == "mixture":
+        assert scores["tt4"] == pytest.approx(0.5 * 3 / sum(lengths.values()))
+
+
+# a small field index to check the array kernels against straightforward dict-based scoring
+fixture_index = {
+    f"t{t}": {f"d{d}": (t * 7 + d * 3) % 5 + 1 for d in range(40) if (t * 11 + d * 13) % (t + 3) == 0}
+    for t in range(12)
+}
+fixture_lengths = {f"d{d}": 5 + (d * 17) % 23 for d in range(40)}
+fixture_avgdl = sum(fixture_lengths.values()) / len(fixture_lengths)
+fixture_queries = [["t1", "t2", "t1"], ["t3", "missing"], ["t0", "t4", "t5", "t11"], ["missing"]]
+
+
+def reference_bm25(query, k1=1.2, b=0.75):
+    scores = {}
+    for term in query:
+        posting = fixture_index.get(term, {})
+        for doc, tf in posting.items():
+            idf = math.log(len(fixture_lengths) / len(posting))
+            norm = 1 - b + b * fixture_lengths[doc] / fixture_avgdl
+            scores[doc] = scores.get(doc, 0) + idf * tf * (k1 + 1) / (tf + k1 * norm)
+    return scores
+
+
+def reference_vector_space_model(query, method):
+    def weigh(tfs, letters):
+        weights = {}
+        for term, tf in tfs.items():
+            weight = 1 + math.log(tf) if letters[0] == "l" and tf > 0 else tf
+            if letters[1] == "t":
+                posting = fixture_index.get(term, {})
+                weight *= math.log(len(fixture_lengths) / len(posting)) if posting else 0
+            weights[term] = weight
+        if letters[2] == "c":
+            norm = math.sqrt(sum(weight ** 2 for weight in weights.values()))
+            weights = {term: weight / norm if norm else 0 for term, weight in weights.items()}
+        return weights
+
+    doc_method, query_method = method.split(".")
+    terms = list(dict.fromkeys(query))
+    query_weights = weigh({term: query.count(term) for term in terms}, query_method)
+    docs = {doc for term in terms for doc in fixture_index.get(term, {})}
+    return {
+        doc: sum(weight * query_weights[term] for term, weight in
+                 weigh({term: fixture_index.get(term, {}).get(doc, 0) for term in terms}, doc_method).items())
+        for doc in docs
+    }
+
+
+def fixture_scorer(postings_matrix=True):
+    return Scorer(fixture_index, len(fixture_lengths),
+                  postings_matrix=PostingsMatrix(fixture_index) if postings_matrix else None)
+
+
+def test_postings_matrix_holds_the_index():
+    postings_matrix = PostingsMatrix(fixture_index)
+    for term, row in postings_matrix.term_rows.items():
+        columns = postings_matrix.matrix[row].indices
+        assert dict(zip(postings_matrix.doc_ids[columns].tolist(), postings_matrix.matrix[row].data.tolist())) \
+            == fixture_index[term]
+
+    docs, tfs = postings_matrix.get_tf_matrix(["t2", "missing", "t1"])
+    assert set(docs) == set(fixture_index["t1"]) | set(fixture_index["t2"])
+    for doc, row in zip(docs, tfs.tolist()):
+        assert row == [fixture_index["t2"].get(doc, 0), 0, fixture_index["t1"].get(doc, 0)]
+
+
+@pytest.mark.parametrize("postings_matrix", [True, False])
+@pytest.mark.parametrize("query", fixture_queries)
+def test_bm25_matches_the_dict_formula(query, postings_matrix):
+    scores = fixture_scorer(postings_matrix).compute_socres_with_okapi_bm25(query, fixture_avgdl, fixture_lengths)
+    expected = reference_bm25(query)
+    assert scores.keys() == expected.keys()
+    for doc, score in expected.items():
+        assert scores[doc] == pytest.approx(score)
+
+
+@pytest.mark.parametrize("query", fixture_queries)
+def test_quantized_bm25_is_close_to_float_bm25(query):
+    scorer = fixture_scorer(postings_matrix=False)
+    scores = scorer.compute_socres_with_okapi_bm25(query, fixture_avgdl, fixture_lengths, quantized=True)
+    expected = reference_bm25(query)
+    assert scores.keys() == expected.keys()
+    # every term is rounded to the nearest int16 unit
+    tolerance = len(query) * 0.5 / scorer.get_bm25_scale()
+    for doc, score in expected.items():
+        assert abs(scores[doc] - score) <= tolerance
+
+
+def test_batched_bm25_matches_single_queries():
+    scorer = fixture_scorer()
+    columns = {doc: j for j, doc in enumerate(scorer.postings_matrix.doc_ids.tolist())}
+    batched = scorer.compute_bm25_scores_batched(fixture_queries, fixture_avgdl, fixture_lengths)
+    for query, row in zip(fixture_queries, batched):
+        expected = reference_bm25(query)
+        assert np.count_nonzero(row) <= len(expected)
+        for doc, score in expected.items():
+            assert row[columns[doc]] == pytest.approx(score)
+
+
+@pytest.mark.parametrize("method", ["lnc.ltc", "ntn.nnn", "ltc.lnc", "nnc.ltn", "lnn.nnc"])
+def test_vector_space_model_matches_the_dict_formula(method):
+    for postings_matrix in (True, False):
+        scorer = fixture_scorer(postings_matrix)
+        for query in fixture_queries:
+            scores = scorer.compute_scores_with_vector_space_model(query, method)
+            expected = reference_vector_space_model(query, method)
+            assert scores.keys() == expected.keys()
+            for doc, score in expected.items():
+                assert scores[doc] == pytest.approx(score)
+
+
+@pytest.mark.parametrize("method", ["lnc.ltc", "ntn.nnn", "ltc.lnc", "nnc.ltn", "lnn.nnc"])
+def test_batched_vector_space_model_matches_the_dict_formula(method):
+    scorer = fixture_scorer()
+    columns = {doc: j for j, doc in enumerate(scorer.postings_matrix.doc_ids.tolist())}
+    for query, row in zip(fixture_queries, scorer.compute_scores_batched(fixture_queries, method)):
+        for doc, score in reference_vector_space_model(query, method).items():
+            assert row[columns[doc]] == pytest.approx(score)
@@ -0,0 +1,81 @@
+import shutil
+
+import orjson
+import pytest
+
+from indexer.index_reader import get_index_reader
+from indexer.indexes_enum import Indexes
+from search import INDEX_DIR, SearchEngine
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = SearchEngine()
+    # the queries are split on whitespace, without the nltk data the preprocessor needs
+    engine._preprocessor.tokenize = lambda text: text.split()
+    engine._preprocessor.lemmatize = lambda word: word
+    return engine
+
+
+@pytest.mark.parametrize("smoothing_method", ["bayes", "mixture", "naive"])
+def test_unigram_query_with_terms_missing_from_a_field(engine, smoothing_method):
+    weights = {Indexes.STARS: 1, Indexes.GENRES: 1, Indexes.SUMMARIES: 1}
+    assert "tom" not in engine.document_indexes[Indexes.SUMMARIES].index
+    assert "drama" in engine.document_indexes[Indexes.SUMMARIES].index
+
+    results = engine.search("tom hanks drama", "unigram", weights, True, 10, smoothing_method=smoothing_method)
+    assert results
+    assert results[0][1] > 0
+
+
+def test_stored_postings_matrices_are_rebuilt_with_the_index(tmp_path):
+    path = tmp_path / "stored_index"
+    shutil.copytree(INDEX_DIR, path)
+    SearchEngine(path=path).store_postings_matrices()
+    assert not SearchEngine(path=path).postings_matrices[Indexes.STARS].matrix.data.flags.writeable
+
+    index_file = path / "stars_index.json"
+    index = orjson.loads(index_file.read_bytes())
+    index["Newterm"] = {next(iter(index["Tom"])): 1}
+    index_file.write_bytes(orjson.dumps(index))
+    get_index_reader.cache_clear()
+
+    postings_matrix = SearchEngine(path=path).postings_matrices[Indexes.STARS]
+    assert postings_matrix.matrix.data.flags.writeable
+    assert "Newterm" in postings_matrix.term_rows
+
+
+def test_closing_the_engine_shuts_its_thread_pool_down():
+    weights = {Indexes.STARS: 1, Indexes.GENRES: 1, Indexes.SUMMARIES: 1}
+    with SearchEngine() as engine:
+        engine._preprocessor.tokenize = lambda text: text.split()
+        engine._preprocessor.lemmatize = lambda word: word
+        engine.search("Drama", "lnc.ltc", weights, True, 10)
+        assert engine._cached_search.cache_info().currsize == 1
+    assert engine._cached_search.cache_info().currsize == 0
+    with pytest.raises(RuntimeError):
+        engine.executor.submit(print)
+
+
+
+@pytest.mark.parametrize("method", ["okapiBM25", "lnc.ltc", "ltn.lnn"])
+@pytest.mark.parametrize("quantize_bm25", [False, True])
+def test_skipped_tiers_do_not_change_the_top_documents_of_a_field(monkeypatch, method, quantize_bm25):
+    engine = SearchEngine(quantize_bm25=quantize_bm25)
+    # the stored tiers of the summaries are almost empty, so they are rebuilt by tf from the summaries index
+    index = engine.document_indexes[Indexes.SUMMARIES].index
+    tiers = {"first_tier": {}, "second_tier": {}, "third_tier": {}}
+    for term, posting in index.items():
+        for doc, tf in posting.items():
+            tier = "first_tier" if tf >= 3 else "second_tier" if tf == 2 else "third_tier"
+            tiers[tier].setdefault(term, {})[doc] = tf
+    monkeypatch.setattr(engine.tiered_index[Indexes.SUMMARIES], "index", tiers)
+
+    skipped_queries = 0
+    for query in [["the", "of"], ["war"], ["love", "family", "the"], ["life", "man", "young"]]:
+        all_tiers = engine.find_scores_with_unsafe_ranking(query, method, {Indexes.SUMMARIES: 1}, None, {})[Indexes.SUMMARIES]
+        top_tiers = engine.find_scores_with_unsafe_ranking(query, method, {Indexes.SUMMARIES: 1}, 5, {})[Indexes.SUMMARIES]
+        skipped_queries += len(top_tiers) < len(all_tiers)
+        kth = sorted(all_tiers.values(), reverse=True)[4]
+        assert {doc for doc, score in all_tiers.items() if score > kth} <= set(sorted(top_tiers, key=top_tiers.get, reverse=True)[:5])
+    assert skipped_queries